@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import DeadJob, Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'key', 'attempts', 'run_at', 'created')
+    search_fields = ('name', 'key')
+
+
+class DeadJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'key', 'attempts', 'failed')
+    search_fields = ('name', 'key')
+
+
+admin.site.register(Job, JobAdmin)
+admin.site.register(DeadJob, DeadJobAdmin)
@@ -0,0 +1,137 @@
+"""Кеширование с версиями областей и защитой от одновременного пересчёта.
+
+Фрагменты шаблонов ключуются версией своей области (лента, группа,
+автор...). Изменение данных поднимает версию, и старые записи больше не
+читаются, поэтому их можно хранить долго.
+
+get_or_compute пересчитывает значение только в одном процессе: остальные
+в это время получают предыдущее значение, пока не истёк льготный период.
+Обновление начинается с вероятностью, растущей к концу срока жизни
+записи, поэтому ключи не истекают одновременно.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import metrics, replicas
+
+VERSION_KEY = 'version:{}'
+LOCK_KEY = 'lock:{}'
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _next_version(current=None):
+    version = time.time_ns()
+    if current is not None and current >= version:
+        return current + 1
+    return version
+
+
+def get_version(*scopes):
+    """Общая версия нескольких областей в виде строки."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _next_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    lag = settings.REPLICA_STICKY_SECONDS * 10 ** 9
+    if replicas.current() and time.time_ns() - max(versions.values()) < lag:
+        # Реплика может ещё не видеть изменение, поднявшее версию, а
+        # отрендеренное сейчас закешируется уже под ней.
+        replicas.read_primary()
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def modified_at(version):
+    """Время изменения по версии из get_version: версия — это time_ns
+    последнего bump_version (или первого обращения к области)."""
+    latest = max(int(part) for part in version.split('.'))
+    return datetime.fromtimestamp(latest / 10 ** 9, timezone.utc)
+
+
+def _bump(scopes):
+    keys = [VERSION_KEY.format(scope) for scope in set(scopes)]
+    versions = cache.get_many(keys)
+    cache.set_many(
+        {key: _next_version(versions.get(key)) for key in keys}, None
+    )
+
+
+def bump_version(*scopes):
+    """Инвалидирует всё, что закешировано под этими областями."""
+    _bump(scopes)
+    # Внутри транзакции — ещё раз после коммита: иначе до коммита кто-то
+    # успеет закешировать старые данные уже под новой версией.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_bump, scopes))
+
+
+def _is_fresh(expires, delta, beta):
+    # XFetch: чем дольше пересчёт и ближе срок, тем вероятнее
+    # досрочное обновление.
+    early = -delta * beta * math.log(1 - random.random())
+    return time.time() + early < expires
+
+
+def _wait_for(key, lock_key):
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(lock_key) is None:
+            return None
+    return None
+
+
+@contextmanager
+def lock(name):
+    """Блокировка name, общая для процессов с одним кешем.
+
+    Ждёт, пока блокировку не снимут или пока она не истечёт через
+    CACHE_LOCK_TIMEOUT.
+    """
+    key = LOCK_KEY.format(name)
+    while not cache.add(key, True, settings.CACHE_LOCK_TIMEOUT):
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def get_or_compute(key, compute, timeout, grace=None, beta=1.0):
+    """Значение из кеша или результат compute() с защитой от давки."""
+    if grace is None:
+        grace = settings.CACHE_GRACE_PERIOD
+    lock_key = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(*entry[1:], beta):
+        metrics.record_cache(hit=True)
+        return entry[0]
+    locked = cache.add(lock_key, True, settings.CACHE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = _wait_for(key, lock_key)
+        if entry is not None:
+            metrics.record_cache(hit=True)
+            return entry[0]
+    metrics.record_cache(hit=False)
+    try:
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+        cache.set(key, (value, time.time() + timeout, delta), timeout + grace)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
@@ -0,0 +1,267 @@
+"""Кеш в файле SQLite, общий для всех процессов на одном хосте.
+
+В отличие от LocMemCache запись и инвалидация в одном воркере сразу
+видны остальным. Размер ограничен числом записей (MAX_ENTRIES) и общим
+объёмом значений в байтах (MAX_SIZE); при переполнении сначала удаляются
+истёкшие записи, затем давно не читавшиеся (LRU).
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/cache/yatube/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 256 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    '''CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL,
+        size INTEGER NOT NULL
+    )''',
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    '''CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries + 1, size = size + NEW.size WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache
+    BEGIN
+        UPDATE cache_stats
+        SET entries = entries - 1, size = size - OLD.size WHERE id = 1;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+    BEGIN
+        UPDATE cache_stats SET size = size - OLD.size + NEW.size WHERE id = 1;
+    END''',
+)
+
+# Время последнего чтения обновляется не чаще раза в LRU_RESOLUTION
+# секунд, чтобы чтение почти никогда не требовало записи.
+LRU_RESOLUTION = 60
+BUSY_TIMEOUT = 5
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = options.get('MAX_SIZE')
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # Иначе INSERT OR REPLACE не вызывает триггер удаления,
+            # и статистика размера расходится.
+            connection.execute('PRAGMA recursive_triggers=ON')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})',
+            list(keys),
+        ).fetchall()
+        found, expired, stale = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[keys[key]] = pickle.loads(value)
+            if accessed < now - LRU_RESOLUTION:
+                stale.append(key)
+        if expired:
+            self._connection.execute(
+                f'DELETE FROM cache WHERE expires <= ? AND key IN '
+                f'({",".join("?" * len(expired))})',
+                [now, *expired],
+            )
+        if stale:
+            self._connection.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN '
+                f'({",".join("?" * len(stale))})',
+                [now, *stale],
+            )
+        return found
+
+    def _row(self, key, value, timeout):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        return key, value, expires, time.time(), len(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = [
+            self._row(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ]
+        # Значение больше всего кеша вытеснило бы все остальные записи.
+        failed = [row[0] for row in rows if not self._fits(row)]
+        rows = [row for row in rows if self._fits(row)]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)', rows
+            )
+            self._cull(connection)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        row = self._row(self._key(key, version), value, timeout)
+        if not self._fits(row):
+            return False
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                '''INSERT INTO cache VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = excluded.value,
+                    expires = excluded.expires,
+                    accessed = excluded.accessed,
+                    size = excluded.size
+                WHERE cache.expires IS NOT NULL AND cache.expires <= ?''',
+                [*row, time.time()],
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._cull(connection)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', [key]
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                [data, len(data), key],
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [
+                self.get_backend_timeout(timeout),
+                self._key(key, version),
+                time.time(),
+            ],
+        )
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._key(key, version), time.time()],
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            placeholders = ','.join('?' * len(keys))
+            self._connection.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys
+            )
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы потока: запросы Django
+        # закрывают кеш в конце каждого запроса.
+        pass
+
+    def _fits(self, row):
+        return self._max_size is None or row[-1] <= self._max_size
+
+    def _over_limit(self, connection):
+        entries, size = connection.execute(
+            'SELECT entries, size FROM cache_stats WHERE id = 1'
+        ).fetchone()
+        if entries > self._max_entries:
+            return True
+        return self._max_size is not None and size > self._max_size
+
+    def _cull(self, connection):
+        if not self._over_limit(connection):
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', [time.time()]
+        )
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        batch = max(self._max_entries // self._cull_frequency, 1)
+        while self._over_limit(connection):
+            connection.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                [batch],
+            )
@@ -0,0 +1,181 @@
+"""Надёжная очередь фоновых задач в базе данных.
+
+enqueue() записывает задачу в таблицу Job в той же транзакции, что и
+данные, поэтому задача не теряется при падении процесса и не
+выполняется для откатившейся записи. Воркер (manage.py run_jobs)
+забирает задачи в аренду на JOBS_LEASE секунд и выполняет их в пуле
+потоков. Задача удаляется из очереди только после выполнения, поэтому
+после падения воркера может выполниться повторно: задачи должны быть
+идемпотентны. Упавшая задача повторяется с экспоненциальной задержкой, а после
+JOBS_MAX_ATTEMPTS попыток переносится в DeadJob. Задача с ключом
+идемпотентности не ставится повторно, пока такая же ждёт выполнения;
+уже взятая воркером задача ключ теряет и повтору не мешает.
+
+Задачи — функции, отмеченные декоратором @task, с аргументами, которые
+сериализуются в JSON. С JOBS_EAGER (в тестах) задача выполняется сразу
+при постановке, без очереди.
+"""
+import json
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import DeadJob, Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = set()
+
+
+def task(func):
+    """Регистрирует функцию как фоновую задачу."""
+    TASKS.add(f'{func.__module__}.{func.__name__}')
+    return func
+
+
+def _resolve(name):
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача: {name}')
+    # По имени, а не из реестра: так задачу можно подменить в тестах.
+    return import_string(name)
+
+
+def enqueue(func, key=None, **kwargs):
+    """Ставит func(**kwargs) в очередь."""
+    name = f'{func.__module__}.{func.__name__}'
+    func = _resolve(name)
+    if settings.JOBS_EAGER:
+        func(**kwargs)
+        return
+    Job.objects.bulk_create(
+        [Job(name=name, payload=json.dumps(kwargs), key=key)],
+        ignore_conflicts=True,
+    )
+
+
+def claim(limit):
+    """Берёт в аренду до limit готовых задач."""
+    now = timezone.now()
+    ready = Job.objects.filter(run_at__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ).order_by('run_at')[:limit]
+    lease = now + timedelta(seconds=settings.JOBS_LEASE)
+    claimed = []
+    for job in ready:
+        # Условие на старое значение: задачу не заберут два воркера.
+        # Ключ снимается: такая же задача, поставленная во время
+        # выполнения, должна выполниться снова, а не отброситься.
+        # В job.key он остаётся, чтобы вернуть его при повторе.
+        if Job.objects.filter(
+            pk=job.pk, locked_until=job.locked_until
+        ).update(locked_until=lease, key=None):
+            job.locked_until = lease
+            claimed.append(job)
+    return claimed
+
+
+def _fail(job, error):
+    job.attempts += 1
+    if job.attempts >= settings.JOBS_MAX_ATTEMPTS:
+        with transaction.atomic():
+            DeadJob.objects.create(
+                name=job.name,
+                payload=job.payload,
+                key=job.key,
+                attempts=job.attempts,
+                error=error,
+                created=job.created,
+            )
+            job.delete()
+        logger.error('Задача %s перенесена в DeadJob:\n%s', job, error)
+        return
+    delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+    try:
+        with transaction.atomic():
+            # Задача снова ждёт выполнения — возвращаем ей ключ.
+            Job.objects.filter(pk=job.pk).update(
+                attempts=job.attempts,
+                run_at=timezone.now() + timedelta(seconds=delay),
+                locked_until=None,
+                last_error=error,
+                key=job.key,
+            )
+    except IntegrityError:
+        # Такую же задачу уже поставили заново: повтор выполнит она.
+        Job.objects.filter(pk=job.pk).delete()
+        return
+    logger.warning('Задача %s упала, повтор через %s с', job, delay)
+
+
+def run(job):
+    """Выполняет взятую в аренду задачу; True, если успешно."""
+    # Без общей транзакции: долгая задача не держит блокировку записи
+    # SQLite, а её запросы выполняются как обычно, в autocommit.
+    try:
+        _resolve(job.name)(**json.loads(job.payload))
+        Job.objects.filter(pk=job.pk).delete()
+    except Exception:
+        _fail(job, traceback.format_exc())
+        return False
+    return True
+
+
+def _run_in_thread(job):
+    try:
+        return run(job)
+    finally:
+        # Соединения с БД у каждого потока свои, закрываем их сами.
+        connections.close_all()
+
+
+def work(workers=1, once=False, poll=1.0, should_stop=lambda: False):
+    """Цикл воркера: возвращает число выполненных и упавших задач.
+
+    once — выйти, когда готовых задач не останется. С одним воркером
+    задачи выполняются в текущем потоке.
+    """
+    done = failed = 0
+    pool = None
+    if workers > 1:
+        pool = ThreadPoolExecutor(workers, thread_name_prefix='jobs')
+    try:
+        while not should_stop():
+            jobs = claim(workers * 2)
+            if not jobs:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+            if pool is None:
+                results = map(run, jobs)
+            else:
+                results = pool.map(_run_in_thread, jobs)
+            for succeeded in results:
+                if succeeded:
+                    done += 1
+                else:
+                    failed += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return done, failed
+
+
+def requeue_dead():
+    """Возвращает задачи из DeadJob в очередь; возвращает их число."""
+    with transaction.atomic():
+        dead = list(DeadJob.objects.all())
+        Job.objects.bulk_create([
+            Job(name=job.name, payload=job.payload, key=job.key)
+            for job in dead
+        ], ignore_conflicts=True)
+        DeadJob.objects.filter(pk__in=[job.pk for job in dead]).delete()
+    return len(dead)
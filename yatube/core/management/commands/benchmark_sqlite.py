@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core import sqlite
+
+# Так открывает соединения Django без настроек: таймаут sqlite3 по
+# умолчанию, журнал DELETE, новое соединение на каждый запрос.
+DEFAULT_TIMEOUT = 5
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при конкурентных '
+            'чтении и записи без настроек и с профилем из SQLITE_PRAGMAS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES[DEFAULT_DB_ALIAS]
+        profiles = {
+            'before': ({}, DEFAULT_TIMEOUT, False),
+            'after': (
+                settings.SQLITE_PRAGMAS,
+                database.get('OPTIONS', {}).get('timeout', DEFAULT_TIMEOUT),
+                bool(database.get('CONN_MAX_AGE')),
+            ),
+        }
+        for name, (pragmas, timeout, reuse) in profiles.items():
+            result = sqlite.benchmark(
+                pragmas, timeout, reuse,
+                readers=options['readers'],
+                writers=options['writers'],
+                seconds=options['seconds'],
+                rows=options['rows'],
+            )
+            values = '  '.join(
+                f'{metric}={value}' for metric, value in result.items()
+            )
+            self.stdout.write(f'{name:<8}{values}')
@@ -0,0 +1,52 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди core.jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков, выполняющих задачи',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, с',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выйти, когда готовых задач не останется',
+        )
+        parser.add_argument(
+            '--requeue-dead', action='store_true',
+            help='Сначала вернуть в очередь задачи из DeadJob',
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f'Возвращено задач: {jobs.requeue_dead()}')
+        stopping = []
+
+        def stop(signum, frame):
+            # Текущие задачи дорабатывают, новые не берутся.
+            stopping.append(signum)
+
+        previous = {
+            signum: signal.signal(signum, stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            done, failed = jobs.work(
+                workers=options['workers'],
+                once=options['once'],
+                poll=options['poll'],
+                should_stop=lambda: bool(stopping),
+            )
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'Выполнено: {done}, с ошибкой: {failed}')
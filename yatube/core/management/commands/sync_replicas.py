@@ -0,0 +1,37 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SQLITE = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики из DATABASE_REPLICAS: '
+            'для проверки чтения из реплик на локальной машине')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS пуст')
+        databases = [
+            connections[alias].settings_dict
+            for alias in (DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS)
+        ]
+        if any(database['ENGINE'] != SQLITE for database in databases):
+            raise CommandError(
+                'Копировать можно только SQLite; другие СУБД наполняет '
+                'их собственная репликация'
+            )
+        primary, *replicas = databases
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias, replica in zip(settings.DATABASE_REPLICAS, replicas):
+                target = sqlite3.connect(replica['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: {replica["NAME"]}')
+        finally:
+            source.close()
@@ -0,0 +1,92 @@
+"""Метрики текущего запроса: SQL, шаблоны, кеш и общее время.
+
+Сбор включает core.middleware.MetricsMiddleware; вне запроса функции
+record_* ничего не делают. Всё хранится в thread-local и стоит пару
+вызовов perf_counter на событие, поэтому сбор можно держать включённым.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Вложенные шаблоны рендерятся внутри внешнего: считаем только
+        # время внешнего.
+        self.template_depth = 0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.total_time * 1000, 1),
+        }
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def collect():
+    """Собирает метрики всего, что выполняется внутри блока."""
+    previous = current()
+    _local.metrics = metrics = RequestMetrics()
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: время и число запросов."""
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+@contextmanager
+def timed_template():
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - started
+
+
+def record_cache(hit):
+    metrics = current()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
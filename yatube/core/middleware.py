@@ -0,0 +1,119 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import render_to_string
+
+from core import metrics, replicas
+from core.templatetags.fragments import MARKER_RE
+
+logger = logging.getLogger('core.metrics')
+
+
+class MetricsMiddleware:
+    """Число и время SQL-запросов, время шаблонов, попадания в кеш и
+    общее время каждого запроса.
+
+    Метрики уходят в заголовок Server-Timing (METRICS_SERVER_TIMING) и
+    строкой JSON в лог core.metrics; запросы, превысившие бюджеты из
+    REQUEST_BUDGETS, пишутся с уровнем WARNING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metrics.collect() as collected, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.record_query)
+                )
+            response = self.get_response(request)
+        values = collected.as_dict()
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(values)
+        self.log(request, response, values)
+        return response
+
+    def log(self, request, response, values):
+        over_budget = sorted(
+            name for name, budget in settings.REQUEST_BUDGETS.items()
+            if values.get(name, 0) > budget
+        )
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **values,
+        }
+        if over_budget:
+            record['over_budget'] = over_budget
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaMiddleware:
+    """После записи в базу ставит cookie, по которой следующие запросы
+    пользователя REPLICA_STICKY_SECONDS секунд читают из основной базы.
+
+    Стоит раньше SessionMiddleware, чтобы учитывалось и сохранение сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with replicas.track_writes() as writes:
+            response = self.get_response(request)
+        if writes['happened'] and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                replicas.STICKY_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class FragmentMiddleware:
+    """Подставляет персональные фрагменты в собранные из частей страницы.
+
+    Тело такой страницы общее для всех пользователей и берётся из кеша,
+    а на месте {% personal %} в нём стоят метки: здесь они заменяются
+    фрагментами, отрендеренными для текущего запроса. Стоит последним,
+    чтобы CommonMiddleware посчитал длину уже собранного ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # Флаг на запросе, а не на ответе: метки выводит и страница
+        # ошибки, если собираемое представление упало (например, 404).
+        if (not getattr(request, 'assemble_fragments', False)
+                or response.streaming):
+            return response
+        response.content = MARKER_RE.sub(
+            lambda match: render_to_string(
+                match.group(1).decode(), request=request
+            ).encode(response.charset),
+            response.content,
+        )
+        return response
+
+
+def server_timing(values):
+    return ', '.join([
+        f'db;dur={values["db_ms"]};desc="{values["queries"]} queries"',
+        f'tpl;dur={values["template_ms"]}',
+        f'cache;desc="{values["cache_hits"]} hits, '
+        f'{values["cache_misses"]} misses"',
+        f'total;dur={values["total_ms"]}',
+    ])
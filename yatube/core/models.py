@@ -0,0 +1,51 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди core.jobs."""
+    name = models.CharField('Задача', max_length=255)
+    payload = models.TextField('Аргументы (JSON)', default='{}')
+    # Пока задача с ключом ждёт выполнения, такая же не ставится.
+    key = models.CharField(
+        'Ключ идемпотентности',
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    run_at = models.DateTimeField('Выполнить не раньше', default=timezone.now)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Поставлена', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at'], name='job_run_at_idx'),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return f'{self.name} {self.payload}'
+
+
+class DeadJob(models.Model):
+    """Задача, которая не выполнилась за JOBS_MAX_ATTEMPTS попыток."""
+    name = models.CharField('Задача', max_length=255)
+    payload = models.TextField('Аргументы (JSON)')
+    key = models.CharField(
+        'Ключ идемпотентности', max_length=255, null=True, blank=True
+    )
+    attempts = models.PositiveIntegerField('Попыток')
+    error = models.TextField('Ошибка')
+    created = models.DateTimeField('Поставлена')
+    failed = models.DateTimeField('Отправлена в архив', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Невыполненная задача'
+        verbose_name_plural = 'Невыполненные задачи'
+
+    def __str__(self):
+        return f'{self.name} {self.payload}'
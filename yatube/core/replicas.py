@@ -0,0 +1,97 @@
+"""Чтение из реплик базы данных.
+
+Запись всегда идёт в default. Читать из реплики (DATABASE_REPLICAS)
+можно только внутри use_replica(): его включает декоратор
+read_from_replica для GET-запросов к представлениям. Всё остальное —
+POST-запросы, сигналы, команды — читает из основной базы.
+
+Реплика отстаёт от основной базы, поэтому после записи запросы
+пользователя REPLICA_STICKY_SECONDS секунд читают из основной (cookie
+STICKY_COOKIE ставит core.middleware.ReplicaMiddleware), и свои
+изменения он видит сразу. Так же REPLICA_STICKY_SECONDS после изменения
+области кеша читают из основной базы все запросы, получившие её версию
+(core.cache.get_version): иначе страница со старыми строками реплики
+закешировалась бы под новой версией.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_local = threading.local()
+
+
+def current():
+    """Алиас реплики для чтения или None, если читать из основной."""
+    return getattr(_local, 'replica', None)
+
+
+@contextmanager
+def use_replica():
+    """Чтение внутри блока идёт из случайной реплики."""
+    previous = current()
+    replicas = settings.DATABASE_REPLICAS
+    _local.replica = random.choice(replicas) if replicas else None
+    try:
+        yield
+    finally:
+        _local.replica = previous
+
+
+def read_primary():
+    """Дальше в этом запросе читать из основной базы."""
+    _local.replica = None
+
+
+@contextmanager
+def track_writes():
+    """Отмечает, была ли внутри блока запись в базу."""
+    previous = getattr(_local, 'writes', None)
+    _local.writes = writes = {'happened': False}
+    try:
+        yield writes
+    finally:
+        _local.writes = previous
+
+
+def read_from_replica(view):
+    """Декоратор представления: GET без свежей записи читает из реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                or STICKY_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current()
+
+    def db_for_write(self, model, **hints):
+        writes = getattr(_local, 'writes', None)
+        if writes is not None:
+            writes['happened'] = True
+        # Дальше в этом запросе читаем то, что только что записали.
+        read_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схему реплик приносит репликация (или sync_replicas).
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
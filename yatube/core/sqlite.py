@@ -0,0 +1,121 @@
+"""Настройка соединений SQLite под нагрузку и замер её эффекта.
+
+При открытии каждого соединения выполняются PRAGMA из SQLITE_PRAGMAS:
+WAL позволяет читать, пока идёт запись, synchronous=NORMAL в режиме WAL
+не ждёт fsync на каждый коммит, mmap_size и cache_size держат горячие
+страницы в памяти. Ожидание блокировки задаёт OPTIONS['timeout'] в
+DATABASES, повторное использование соединений — CONN_MAX_AGE.
+
+benchmark() сравнивает пропускную способность чтения и записи при
+конкурентной нагрузке на отдельном файле, не трогая рабочую базу;
+используется командой benchmark_sqlite.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+READ_SQL = (
+    'SELECT id, text FROM post WHERE author_id = ? '
+    'ORDER BY pub_date DESC LIMIT 10'
+)
+WRITE_SQL = 'INSERT INTO post (author_id, pub_date, text) VALUES (?, ?, ?)'
+SCHEMA = (
+    '''CREATE TABLE post (
+        id INTEGER PRIMARY KEY,
+        author_id INTEGER NOT NULL,
+        pub_date REAL NOT NULL,
+        text TEXT NOT NULL
+    )''',
+    'CREATE INDEX post_author_date ON post (author_id, pub_date)',
+)
+AUTHORS = 100
+TEXT = 'Текст поста ' * 20
+
+
+def apply_pragmas(connection, pragmas=None):
+    """Выполняет PRAGMA на соединении sqlite3."""
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection)
+
+
+def _seed(path, pragmas, rows):
+    connection = sqlite3.connect(path)
+    apply_pragmas(connection, pragmas)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    now = time.time()
+    connection.executemany(WRITE_SQL, (
+        (n % AUTHORS, now - n, TEXT) for n in range(rows)
+    ))
+    connection.commit()
+    connection.close()
+
+
+def _worker(path, pragmas, timeout, reuse, write, deadline, totals, lock):
+    done = errors = 0
+    connection = None
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        if connection is None:
+            connection = sqlite3.connect(path, timeout=timeout)
+            apply_pragmas(connection, pragmas)
+        try:
+            if write:
+                connection.execute(WRITE_SQL, (n % AUTHORS, time.time(), TEXT))
+                connection.commit()
+            else:
+                connection.execute(READ_SQL, (n % AUTHORS,)).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            # database is locked: ожидание блокировки не помогло.
+            connection.rollback()
+            errors += 1
+        if not reuse:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    kind = 'writes' if write else 'reads'
+    with lock:
+        totals[kind] += done
+        totals['errors'] += errors
+
+
+def benchmark(pragmas, timeout, reuse, readers=4, writers=2, seconds=3,
+              rows=10000):
+    """Чтений и записей в секунду и число ошибок блокировки при
+    readers читающих и writers пишущих потоках."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        _seed(path, pragmas, rows)
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+        threads = [
+            threading.Thread(target=_worker, args=(
+                path, pragmas, timeout, reuse, write, deadline, totals, lock,
+            ))
+            for write in [False] * readers + [True] * writers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return {
+        'reads_per_s': round(totals['reads'] / seconds),
+        'writes_per_s': round(totals['writes'] / seconds),
+        'errors': totals['errors'],
+    }
@@ -0,0 +1,87 @@
+"""Хранилище файлов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого, разложенный по подкаталогам:
+posts/photo.jpg сохраняется как posts/3f/a2/3fa2….jpg. Повторная
+загрузка того же файла не пишет ничего нового и получает то же имя, а
+вместе с ним и уже готовые миниатюры sorl-thumbnail. Поэтому один файл
+может принадлежать нескольким объектам, и удалять его можно только когда
+ссылок не осталось (posts.images.release).
+
+Ссылка на файл появляется только с коммитом объекта, а до тех пор файл
+может удалить release. Поэтому после коммита save проверяет, что файл на
+месте, и записывает его заново; проверка и удаление идут под одной
+блокировкой file_lock(name). Загруженный файл к коммиту уже закрыт, так
+что до него держится временная копия содержимого. Вне транзакции
+проверять нечего: файл только что записан.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from functools import partial
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+from core.cache import lock
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 2 ** 10
+# Копия для восстановления больше этого размера пишется на диск.
+SPOOL_SIZE = 2 ** 20
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """Имя файла по его содержимому с каталогом и расширением name."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(
+                partial(self._restore, name, _copy(content))
+            )
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def _restore(self, name, copy):
+        try:
+            with copy, file_lock(name):
+                if self.exists(name):
+                    return
+                self._save(name, File(copy, name))
+        except Exception:
+            logger.exception('Не удалось восстановить файл %s', name)
+
+
+def _copy(content):
+    """Временная копия content: после отката транзакции её закроет сборщик
+    мусора вместе с неисполненным on_commit."""
+    copy = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    for chunk in content.chunks(CHUNK_SIZE):
+        copy.write(chunk)
+    content.seek(0)
+    copy.seek(0)
+    return copy
+
+
+def file_lock(name):
+    """Блокировка файла name на время проверки ссылок и удаления."""
+    return lock(f'file:{name}')
@@ -0,0 +1,22 @@
+"""Бэкенд шаблонов Django, который учитывает время рендера в метриках
+запроса (core.metrics)."""
+from django.template.backends import django
+
+from core import metrics
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        with metrics.timed_template():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django.TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
@@ -0,0 +1,27 @@
+import re
+
+from django import template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# Метка, которую core.middleware.FragmentMiddleware заменяет фрагментом.
+MARKER = '<!--fragment:{}-->'
+MARKER_RE = re.compile(rb'<!--fragment:([\w/.-]+)-->')
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, template_name):
+    """Персональный фрагмент страницы.
+
+    Обычно это {% include %}. Если страница собирается из частей
+    (request.assemble_fragments), вместо фрагмента выводится метка: тело
+    страницы без персональных данных можно кешировать для всех, а
+    фрагмент текущего пользователя подставит middleware.
+    """
+    request = context.get('request')
+    if getattr(request, 'assemble_fragments', False):
+        return mark_safe(MARKER.format(template_name))
+    included = context.template.engine.get_template(template_name)
+    with context.push():
+        return included.render(context)
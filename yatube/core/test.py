@@ -1,9 +1,312 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile, TemporaryUploadedFile,
+)
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from http import HTTPStatus
 
+from core.cache import (
+    LOCK_KEY, VERSION_KEY, bump_version, get_or_compute, get_version,
+)
+from core import jobs
+from core.cache_backends import SQLiteCache
+from core.models import DeadJob, Job
+from core.replicas import (
+    STICKY_COOKIE, ReplicaRouter, current, read_from_replica, use_replica,
+)
+from core.sqlite import benchmark
+from core.storage import ContentAddressedStorage
+
 
 class ViewTestClass(TestCase):
     def test_error_page(self):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_version_changes_only_its_scope(self):
+        index, group = get_version('index'), get_version('group')
+        bump_version('index')
+        self.assertNotEqual(get_version('index'), index)
+        self.assertEqual(get_version('group'), group)
+
+    def test_get_or_compute_caches_value(self):
+        compute = mock.Mock(return_value='value')
+        for _ in range(3):
+            self.assertEqual(get_or_compute('key', compute, 60), 'value')
+        compute.assert_called_once()
+
+    def test_stale_value_served_while_other_recomputes(self):
+        get_or_compute('key', lambda: 'old', 60)
+        cache.add(LOCK_KEY.format('key'), True)
+        compute = mock.Mock(return_value='new')
+        with mock.patch('core.cache._is_fresh', return_value=False):
+            self.assertEqual(get_or_compute('key', compute, 60), 'old')
+        compute.assert_not_called()
+
+    def test_expired_value_recomputed_by_lock_owner(self):
+        get_or_compute('key', lambda: 'old', 60)
+        with mock.patch('core.cache._is_fresh', return_value=False):
+            self.assertEqual(get_or_compute('key', lambda: 'new', 60), 'new')
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 3, 'MAX_SIZE': 1000}}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_writes_visible_to_other_instances(self):
+        other = SQLiteCache(self.location, {})
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(other.get('key'), {'value': 1})
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_respects_live_and_expired_entries(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertTrue(self.cache.add('expired', 2))
+        self.assertEqual(self.cache.get_many(['key', 'expired']), {
+            'key': 1, 'expired': 2,
+        })
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    @mock.patch('core.cache_backends.LRU_RESOLUTION', -1)
+    def test_evicts_least_recently_used(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 'a')
+
+    def test_size_limit(self):
+        self.assertEqual(self.cache.set_many({'big': 'x' * 2000}), [':1:big'])
+        self.assertFalse(self.cache.add('big', 'x' * 2000))
+        self.cache.set('a', 'x' * 400)
+        self.cache.set('b', 'x' * 400)
+        self.cache.set('c', 'x' * 400)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('c'), 'x' * 400)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_same_content_shares_one_file(self):
+        first = self.storage.save('posts/a.JPG', ContentFile(b'meme'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'meme'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2'
+                                r'[0-9a-f]{60}\.jpg$')
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b'meme')
+
+    def test_file_deleted_before_commit_is_restored(self):
+        callbacks = []
+        with mock.patch(
+            'core.storage.transaction.on_commit', callbacks.append
+        ):
+            name = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+            self.storage.save('posts/b.jpg', ContentFile(b'meme'))
+            # Файл удалили как ненужный, пока новый пост не закоммичен.
+            self.storage.delete(name)
+        for callback in callbacks:
+            callback()
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'meme')
+
+    def test_closed_upload_is_restored(self):
+        uploads = (
+            SimpleUploadedFile('a.jpg', b'simple'),
+            TemporaryUploadedFile('b.jpg', 'image/jpeg', 9, None),
+        )
+        uploads[1].write(b'temporary')
+        callbacks, names = [], []
+        with mock.patch(
+            'core.storage.transaction.on_commit', callbacks.append
+        ):
+            for upload in uploads:
+                names.append(self.storage.save(f'posts/{upload.name}', upload))
+                # Загрузки закрываются до коммита, а временная удаляется.
+                upload.close()
+                self.storage.delete(names[-1])
+        for callback in callbacks:
+            callback()
+        for name, content in zip(names, (b'simple', b'temporary')):
+            with self.storage.open(name) as file:
+                self.assertEqual(file.read(), content)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertIn('0 hits', timing)
+        response = self.client.get('/')
+        self.assertNotIn('0 hits', response['Server-Timing'])
+
+    @override_settings(REQUEST_BUDGETS={'queries': 0, 'total_ms': 10 ** 6})
+    def test_over_budget_request_is_logged_as_warning(self):
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get('/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], HTTPStatus.OK)
+        self.assertEqual(record['over_budget'], ['queries'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def test_reads_go_to_replica_until_write(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(None))
+        with use_replica():
+            self.assertEqual(router.db_for_read(None), 'replica')
+            self.assertEqual(router.db_for_write(None), 'default')
+            self.assertIsNone(router.db_for_read(None))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+
+    def test_only_safe_requests_without_recent_write_use_replica(self):
+        view = read_from_replica(lambda request: HttpResponse(current()))
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/')).content, b'replica')
+        self.assertEqual(view(factory.post('/')).content, b'None')
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(view(request).content, b'None')
+
+    def test_recently_changed_scope_reads_from_primary(self):
+        cache.set(VERSION_KEY.format('old'), time.time_ns() - 10 ** 12, None)
+        bump_version('fresh')
+        with use_replica():
+            get_version('old')
+            self.assertEqual(current(), 'replica')
+            get_version('old', 'fresh')
+            self.assertIsNone(current())
+
+    def test_write_makes_reads_sticky_to_primary(self):
+        user = get_user_model().objects.create(username='auth')
+        self.client.force_login(user)
+        response = self.client.get('/nonexist-page/')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        response = self.client.get('/auth/logout/')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 5)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64 * 2 ** 10)
+
+    def test_benchmark_measures_reads_and_writes(self):
+        result = benchmark(
+            {'journal_mode': 'WAL'}, 5, True,
+            readers=1, writers=1, seconds=0.2, rows=10,
+        )
+        self.assertGreater(result['reads_per_s'], 0)
+        self.assertGreater(result['writes_per_s'], 0)
+
+
+CALLS = []
+
+
+@jobs.task
+def record(value):
+    CALLS.append(value)
+
+
+@jobs.task
+def explode():
+    raise RuntimeError('Сломалось')
+
+
+@jobs.task
+def record_and_enqueue(value):
+    CALLS.append(value)
+    if value == 1:
+        # Данные изменились, пока задача выполнялась.
+        jobs.enqueue(record_and_enqueue, key='record', value=2)
+
+
+@override_settings(JOBS_EAGER=False, JOBS_RETRY_DELAY=0, JOBS_MAX_ATTEMPTS=2)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_idempotent_enqueue_and_worker_run(self):
+        jobs.enqueue(record, key='record:1', value=1)
+        jobs.enqueue(record, key='record:1', value=1)
+        jobs.enqueue(record, value=2)
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(CALLS, [])
+        self.assertEqual(jobs.work(once=True), (2, 0))
+        self.assertEqual(sorted(CALLS), [1, 2])
+        self.assertFalse(Job.objects.exists())
+
+    def test_enqueue_while_running_is_not_dropped(self):
+        jobs.enqueue(record_and_enqueue, key='record', value=1)
+        self.assertEqual(jobs.work(once=True), (2, 0))
+        self.assertEqual(CALLS, [1, 2])
+
+    def test_failed_job_is_retried_then_dead_lettered(self):
+        jobs.enqueue(explode, key='explode')
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertEqual(jobs.work(once=True), (0, 2))
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual(dead.attempts, 2)
+        self.assertIn('Сломалось', dead.error)
+        self.assertEqual(jobs.requeue_dead(), 1)
+        self.assertEqual(Job.objects.get().key, 'explode')
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_immediately(self):
+        jobs.enqueue(record, key='record:3', value=3)
+        self.assertEqual(CALLS, [3])
+        self.assertFalse(Job.objects.exists())
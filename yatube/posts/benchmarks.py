@@ -0,0 +1,268 @@
+"""Генератор данных и замеры скорости страниц с лентами.
+
+generate() наполняет базу пользователями, группами, постами, подписками
+и комментариями в заданных объёмах, run() прогоняет страницы через
+тестовый клиент Django и считает перцентили времени ответа, число
+SQL-запросов и пиковую память на запрос. Используются командами
+generate_data и benchmark.
+
+Фикстуры tests/fixtures здесь не используются. Это фикстуры pytest
+учебных тестов: вне pytest их не вызвать, а объекты они создают по
+одному (create, mixer.blend). Каждое сохранение отправляет сигналы —
+раскладку по лентам, счётчики, поиск, — и на миллионе постов это часы.
+generate() пишет пачками bulk_create и пересобирает производные данные
+один раз. Клиент для страниц готовится так же, как фикстура user_client:
+Client и force_login.
+"""
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from itertools import accumulate, chain, islice
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import caching
+from .models import Comment, Follow, Group, Post
+from .transfer import bulk_create_dated, refresh_derived, reset_sequences
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+USERNAME = 'bench{}'
+PERCENTILES = (50, 95, 99)
+
+
+def _batched(objects, model, date_field=None, **kwargs):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        if date_field:
+            bulk_create_dated(model, batch, date_field, **kwargs)
+        else:
+            model.objects.bulk_create(batch, **kwargs)
+
+
+def generate(users, groups, posts, follows, comments, threads=0,
+             thread_size=0, seed=0, log=print):
+    """Создаёт данные для замеров.
+
+    Популярность авторов распределена по закону Ципфа: на первых
+    пользователей подписаны почти все, так что в ленте подписок есть и
+    «знаменитости», и обычные авторы. threads постов получают по
+    thread_size комментариев.
+    """
+    fake = Faker('ru_RU')
+    Faker.seed(seed)
+    rng = random.Random(seed)
+    now = timezone.now()
+    texts = [fake.paragraph(nb_sentences=5) for _ in range(1000)]
+
+    first = User.objects.count()
+    _batched((
+        User(username=USERNAME.format(first + n), password='!')
+        for n in range(users)
+    ), User)
+    user_ids = list(User.objects.filter(
+        username__startswith=USERNAME.format('')
+    ).values_list('pk', flat=True))
+    log(f'Пользователей: {len(user_ids)}')
+
+    first = Group.objects.count()
+    _batched((
+        Group(
+            title=f'Группа {first + n}',
+            slug=f'bench-{first + n}',
+            description=fake.sentence(),
+        )
+        for n in range(groups)
+    ), Group)
+    group_ids = list(Group.objects.values_list('pk', flat=True)) or [None]
+
+    weights = list(accumulate(
+        1 / rank for rank in range(1, len(user_ids) + 1)
+    ))
+    _batched((
+        Post(
+            text=rng.choice(texts),
+            author_id=rng.choices(user_ids, cum_weights=weights)[0],
+            group_id=rng.choice(group_ids + [None]),
+            pub_date=now - timedelta(minutes=n),
+        )
+        for n in range(posts)
+    ), Post, 'pub_date')
+    log(f'Постов: {posts}')
+    _batched((
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in set(rng.choices(
+            user_ids, cum_weights=weights, k=follows
+        )) - {user_id}
+    ), Follow, ignore_conflicts=True)
+    log(f'Подписок: {Follow.objects.count()}')
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    commented = chain(
+        ((post_id, rng.randint(0, 2 * comments)) for post_id in post_ids),
+        ((post_id, thread_size) for post_id in rng.sample(
+            post_ids, min(threads, len(post_ids))
+        )),
+    )
+    _batched((
+        Comment(
+            post_id=post_id,
+            author_id=rng.choice(user_ids),
+            text=rng.choice(texts)[:200],
+            created=now - timedelta(seconds=n),
+        )
+        for post_id, count in commented
+        for n in range(count)
+    ), Comment, 'created')
+    log(f'Комментариев: {Comment.objects.count()}')
+    reset_sequences(Post, Comment)
+
+    slugs = Group.objects.values_list('slug', flat=True)
+    usernames = User.objects.filter(
+        username__startswith=USERNAME.format('')
+    ).values_list('username', flat=True)
+    refresh_derived([
+        caching.INDEX,
+        *(caching.group_scope(slug) for slug in slugs),
+        *(caching.group_id_scope(pk) for pk in group_ids if pk),
+        *(caching.author_scope(username) for username in usernames),
+        *(caching.author_id_scope(pk) for pk in user_ids),
+        *(caching.follow_scope(pk) for pk in user_ids),
+        *(caching.post_scope(pk) for pk in post_ids),
+    ])
+    log('Счётчики, поиск и ленты пересобраны')
+
+
+def pages():
+    """Страницы для замеров: (имя, URL, пользователь или None)."""
+    group = Group.objects.annotate(
+        size=Count('posts')
+    ).order_by('-size').first()
+    author = User.objects.annotate(
+        size=Count('posts')
+    ).order_by('-size').first()
+    reader = User.objects.annotate(
+        size=Count('follower')
+    ).order_by('-size').first()
+    post = Post.objects.annotate(
+        size=Count('comments')
+    ).order_by('-size').first()
+    result = [('index', reverse('posts:index'), None)]
+    if group:
+        result.append((
+            'group_posts',
+            reverse('posts:group_list', args=[group.slug]),
+            None,
+        ))
+    if author:
+        result.append((
+            'profile',
+            reverse('posts:profile', args=[author.username]),
+            None,
+        ))
+    if reader:
+        result.append(('follow_index', reverse('posts:follow_index'), reader))
+    if post:
+        result.append((
+            'post_detail',
+            reverse('posts:post_detail', args=[post.pk]),
+            None,
+        ))
+    return result
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, round(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+def measure(client, url, requests, cold):
+    """Замеры одной страницы: перцентили времени в мс, запросы, память."""
+    timings, queries = [], []
+    for _ in range(requests):
+        if cold:
+            cache.clear()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} вернул {response.status_code}')
+        queries.append(counter.count)
+    # tracemalloc замедляет код, поэтому память меряется отдельным
+    # запросом.
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {
+        f'p{percent}_ms': round(percentile(timings, percent), 2)
+        for percent in PERCENTILES
+    }
+    result['queries'] = statistics.median(queries)
+    result['memory_kb'] = round(peak / 1024)
+    return result
+
+
+def run(requests=50, warmup=5, cold=False):
+    """Замеры всех страниц: {имя: результат measure}."""
+    results = {}
+    # Строка лога на каждый запрос только мешает замерам.
+    metrics_logger = logging.getLogger('core.metrics')
+    metrics_logger.disabled = True
+    try:
+        for name, url, user in pages():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            for _ in range(warmup):
+                client.get(url)
+            results[name] = measure(client, url, requests, cold)
+    finally:
+        metrics_logger.disabled = False
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Сравнение с базовыми замерами: [(страница, метрика, было, стало,
+    изменение в процентах, регрессия ли)]."""
+    rows = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if before is None:
+                continue
+            change = (value - before) / before * 100 if before else 0
+            rows.append(
+                (name, metric, before, value, change, change > tolerance)
+            )
+    return rows
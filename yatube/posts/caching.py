@@ -0,0 +1,189 @@
+"""Области кеша лент и страниц постов."""
+import hashlib
+import time
+from functools import wraps
+
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core import metrics
+from core.cache import get_or_compute, get_version, modified_at
+
+from .models import Post
+
+INDEX = 'index'
+PAGE_KEY = 'page:{}:{}:{}'
+POST_RELATED_KEY = 'post-related:{}:{}'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+# Автор и группа по id — для страницы поста: имя и число постов автора,
+# название группы. По имени и slug их с поста не узнать без запроса.
+def author_id_scope(author_id):
+    return f'author-id:{author_id}'
+
+
+def group_id_scope(group_id):
+    return f'group-id:{group_id}'
+
+
+# Области, от которых зависят страницы: аргументы как у представлений.
+def index_scopes(request):
+    return [INDEX]
+
+
+def group_scopes(request, slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(request, username):
+    # От подписок зрителя зависит кнопка «Подписаться».
+    return [author_scope(username), follow_scope(request.user.pk)]
+
+
+def post_scopes(request, post_id):
+    scope = post_scope(post_id)
+    # Автор и группа поста меняются только вместе с версией поста,
+    # поэтому кешируются под ней и не требуют запроса к базе.
+    related = get_or_compute(
+        POST_RELATED_KEY.format(post_id, get_version(scope)),
+        lambda: Post.objects.filter(pk=post_id).values_list(
+            'author_id', 'group_id'
+        ).first(),
+        settings.PAGE_CACHE_TIMEOUT,
+    )
+    if related is None:
+        return [scope]
+    author_id, group_id = related
+    scopes = [scope, author_id_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_id_scope(group_id))
+    return scopes
+
+
+def conditional(scopes):
+    """Условный GET по версиям областей страницы.
+
+    scopes(request, *args, **kwargs) возвращает области, от которых
+    зависит страница. ETag и Last-Modified считаются по их версиям, без
+    запросов к базе, поэтому ответ 304 не выполняет ни запрос страницы,
+    ни рендер шаблона. В ETag входят пользователь и CSRF-cookie: от них
+    зависят шапка и формы страницы. Last-Modified отдаётся только
+    анонимам — страница пользователя меняется не только вместе с
+    областями. Его точность — секунда, а версий — наносекунда: пока
+    не прошла секунда последнего изменения, следующее изменение в ту же
+    секунду не изменило бы Last-Modified. Поэтому в эту секунду
+    отдаётся только ETag.
+    """
+    def etag(request, *args, **kwargs):
+        parts = [
+            get_version(*scopes(request, *args, **kwargs)),
+            str(request.user.pk),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        ]
+        return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        modified = modified_at(
+            get_version(*scopes(request, *args, **kwargs))
+        )
+        if modified.timestamp() // 1 >= time.time() // 1:
+            return None
+        return modified
+
+    def decorator(view):
+        view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # Браузер хранит страницу, но перед показом сверяет её с
+            # сервером.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def _cached_response(view, scopes, variant, request, *args, **kwargs):
+    key = PAGE_KEY.format(
+        variant,
+        get_version(*scopes(request, *args, **kwargs)),
+        request.path + '?' + urlencode(sorted(request.GET.items())),
+    )
+    response = cache.get(key)
+    metrics.record_cache(hit=response is not None)
+    if response is not None:
+        return response
+    response = view(request, *args, **kwargs)
+    if (response.status_code == 200 and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')):
+        cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+    return response
+
+
+def anonymous_page(scopes):
+    """Кеш целых ответов для анонимов.
+
+    Ключ — путь с параметрами запроса и версия областей страницы, так
+    что ответ устаревает ровно тогда, когда сигналы поднимают версию
+    области: пост создан, изменён или удалён. Запросы авторизованных
+    пользователей и ответы, которые ставят cookie, в кеш не попадают —
+    для страниц, общих и для них, есть assembled_page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in SAFE_METHODS
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            return _cached_response(
+                view, scopes, 'anonymous', request, *args, **kwargs
+            )
+        return wrapper
+    return decorator
+
+
+def assembled_page(scopes):
+    """Кеш ответов, общий и для вошедших пользователей.
+
+    Страница собирается из частей: вместо персональных фрагментов
+    ({% personal %}) в закешированном теле стоят метки, а фрагменты
+    текущего пользователя подставляет core.middleware.FragmentMiddleware.
+    Тело различается только для анонимов и вошедших — от этого зависят
+    вкладки ленты подписок. Ключ и инвалидация как у anonymous_page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return view(request, *args, **kwargs)
+            request.assemble_fragments = True
+            variant = 'user' if request.user.is_authenticated else 'guest'
+            return _cached_response(
+                view, scopes, variant, request, *args, **kwargs
+            )
+        return wrapper
+    return decorator
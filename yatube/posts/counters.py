@@ -0,0 +1,103 @@
+"""Денормализованные счётчики постов и комментариев.
+
+Значения обновляются сигналами при сохранении и удалении постов и
+комментариев, а команда reconcile_counters периодически сверяет их с
+базой. Отсутствующий счётчик считается точно при первом чтении.
+"""
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Comment, Counter, Post
+
+BATCH_SIZE = 500
+
+EXACT_COUNTS = {
+    Counter.POSTS: lambda object_id: Post.objects.all(),
+    Counter.GROUP_POSTS: lambda object_id: Post.objects.filter(
+        group_id=object_id
+    ),
+    Counter.AUTHOR_POSTS: lambda object_id: Post.objects.filter(
+        author_id=object_id
+    ),
+    Counter.POST_COMMENTS: lambda object_id: Comment.objects.filter(
+        post_id=object_id
+    ),
+}
+
+
+def _create(scope, object_id):
+    value = EXACT_COUNTS[scope](object_id).count()
+    try:
+        with transaction.atomic():
+            Counter.objects.create(
+                scope=scope, object_id=object_id, value=value
+            )
+    except IntegrityError:
+        return Counter.objects.get(scope=scope, object_id=object_id).value
+    return value
+
+
+def get(scope, object_id=0):
+    """Текущее значение счётчика."""
+    value = Counter.objects.filter(
+        scope=scope, object_id=object_id
+    ).values_list('value', flat=True).first()
+    if value is None:
+        return _create(scope, object_id)
+    return value
+
+
+def total(scope, object_ids):
+    """Сумма счётчиков для нескольких объектов одной области."""
+    object_ids = set(object_ids)
+    values = dict(Counter.objects.filter(
+        scope=scope, object_id__in=object_ids
+    ).values_list('object_id', 'value'))
+    for object_id in object_ids - values.keys():
+        values[object_id] = _create(scope, object_id)
+    return sum(values.values())
+
+
+def change(scope, object_id=0, delta=1):
+    """Сдвигает счётчик; отсутствующий будет посчитан при чтении."""
+    if object_id is None:
+        return
+    Counter.objects.filter(scope=scope, object_id=object_id).update(
+        value=F('value') + delta
+    )
+
+
+def discard(scope, object_id):
+    Counter.objects.filter(scope=scope, object_id=object_id).delete()
+
+
+def _exact_counters():
+    yield Counter(scope=Counter.POSTS, value=Post.objects.count())
+    grouped = (
+        (Counter.GROUP_POSTS, Post.objects.filter(group__isnull=False),
+         'group'),
+        (Counter.AUTHOR_POSTS, Post.objects.all(), 'author'),
+        (Counter.POST_COMMENTS, Comment.objects.all(), 'post'),
+    )
+    for scope, queryset, field in grouped:
+        rows = queryset.order_by().values_list(field).annotate(
+            value=Count('pk')
+        )
+        for object_id, value in rows.iterator():
+            yield Counter(scope=scope, object_id=object_id, value=value)
+
+
+def reconcile():
+    """Пересчитывает все счётчики по базе, возвращает их количество."""
+    counters = _exact_counters()
+    created = 0
+    with transaction.atomic():
+        Counter.objects.all().delete()
+        while True:
+            batch = list(islice(counters, BATCH_SIZE))
+            if not batch:
+                return created
+            Counter.objects.bulk_create(batch)
+            created += len(batch)
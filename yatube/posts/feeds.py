@@ -0,0 +1,218 @@
+"""Материализованная лента подписок.
+
+Новый пост автора раскладывается в ленты его подписчиков (fan-out on
+write). Посты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+не раскладываются, а подмешиваются в ленту при чтении.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Q
+
+from core.cache import bump_version, get_or_compute
+from core.jobs import task
+
+from . import caching
+from .models import FeedItem, Follow, Post
+
+CELEBRITIES_CACHE_KEY = 'feed:celebrities:{}'
+
+
+def celebrity_ids():
+    """Авторы, посты которых подмешиваются в ленту при чтении."""
+    limit = settings.FEED_FANOUT_LIMIT
+    return get_or_compute(
+        CELEBRITIES_CACHE_KEY.format(limit),
+        lambda: frozenset(
+            Follow.objects.values('author')
+            .annotate(followers=Count('pk'))
+            .filter(followers__gt=limit)
+            .values_list('author', flat=True)
+        ),
+        settings.FEED_CELEBRITIES_TIMEOUT,
+    )
+
+
+def _create_items(items):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, settings.FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _create_items(
+        FeedItem(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+@task
+def fan_out_post(post_id):
+    """Фоновая задача: fan_out нового поста."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return
+    fan_out(post)
+    # Ленты подписок кешируются с версией INDEX, которую сигнал поднял
+    # ещё до раскладки: поднимаем её снова, когда пост уже в лентах.
+    bump_version(caching.INDEX)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя уже опубликованные посты автора."""
+    if author_id in celebrity_ids():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    _create_items(
+        FeedItem(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+@task
+def backfill_follow(user_id, author_id):
+    """Фоновая задача: backfill новой подписки."""
+    # Пока задача ждала, пользователь мог отписаться.
+    if not Follow.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).exists():
+        return
+    backfill(user_id, author_id)
+    bump_version(caching.follow_scope(user_id))
+
+
+def backfill_many(user_id, author_ids):
+    """backfill сразу для многих авторов: посты выбираются пачками по
+    FEED_BATCH_SIZE авторов, а не отдельным запросом на каждого."""
+    author_ids = sorted(set(author_ids) - celebrity_ids())
+    size = settings.FEED_BATCH_SIZE
+    for start in range(0, len(author_ids), size):
+        posts = Post.objects.filter(
+            author_id__in=author_ids[start:start + size]
+        ).values_list('pk', 'author_id', 'pub_date')
+        _create_items(
+            FeedItem(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, author_id, pub_date in posts.iterator()
+        )
+
+
+@task
+def backfill_follows(user_id, author_ids):
+    """Фоновая задача: backfill массовой подписки."""
+    author_ids = Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).values_list('author_id', flat=True)
+    backfill_many(user_id, list(author_ids))
+    bump_version(caching.follow_scope(user_id))
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора."""
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    FeedItem.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(
+        user_id=user_id
+    ).values_list('author_id', flat=True)
+    for author_id in authors:
+        backfill(user_id, author_id)
+
+
+def rebuild_all():
+    """Собирает все ленты заново одним запросом INSERT ... SELECT: после
+    массовой загрузки это на порядки быстрее, чем rebuild по одному."""
+    # После загрузки подписок закешированный список знаменитостей устарел.
+    cache.delete(CELEBRITIES_CACHE_KEY.format(settings.FEED_FANOUT_LIMIT))
+    FeedItem.objects.all().delete()
+    quote = connection.ops.quote_name
+    feed, follow, post = (
+        quote(model._meta.db_table) for model in (FeedItem, Follow, Post)
+    )
+    sql = (
+        f'INSERT INTO {feed} (user_id, post_id, author_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {follow} f JOIN {post} p ON p.author_id = f.author_id'
+    )
+    celebrities = list(celebrity_ids())
+    if celebrities:
+        placeholders = ', '.join(['%s'] * len(celebrities))
+        sql += f' WHERE p.author_id NOT IN ({placeholders})'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, celebrities)
+
+
+def followed_celebrities(user):
+    """Знаменитости, на которых подписан пользователь."""
+    celebrities = celebrity_ids()
+    if not celebrities:
+        return []
+    return list(Follow.objects.filter(
+        user=user, author__in=celebrities
+    ).values_list('author_id', flat=True))
+
+
+def merged_posts(user, celebrities):
+    """Лента вместе с постами знаменитостей.
+
+    Из ленты и от каждой знаменитости берётся по индексу не больше
+    FEED_MERGE_LIMIT новых постов: сортировать при слиянии приходится
+    ограниченное число строк, а не всю ленту. Глубже FEED_MERGE_LIMIT
+    такая лента не листается.
+    """
+    limit = settings.FEED_MERGE_LIMIT
+    merged = Q(pk__in=FeedItem.objects.filter(user=user).order_by(
+        F('pub_date').desc(), F('post').desc()
+    ).values('post')[:limit])
+    for author_id in celebrities:
+        merged |= Q(pk__in=Post.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-pk').values('pk')[:limit])
+    return Post.objects.filter(merged)
+
+
+def feed_posts(user, celebrities=None):
+    """Посты ленты подписок пользователя.
+
+    celebrities — результат followed_celebrities(user), если он уже есть.
+    """
+    if celebrities is None:
+        celebrities = followed_celebrities(user)
+    if celebrities:
+        return merged_posts(user, celebrities)
+    # Порядок по записи ленты, а не по посту: тогда страница берётся
+    # из индекса (user, -pub_date, -post) без сортировки. F() нужен,
+    # чтобы Django не присоединял пост ещё раз ради его ordering.
+    return Post.objects.filter(feed_items__user=user).order_by(
+        F('feed_items__pub_date').desc(), F('feed_items__post').desc()
+    )
@@ -0,0 +1,75 @@
+"""Массовые подписки и отписки.
+
+Авторы передаются queryset'ом пользователей (по списку имён — authors(),
+или, например, все авторы группы), поэтому выбираются одним запросом.
+Подписки создаются bulk_create(ignore_conflicts=True): уже существующие
+отсекает ограничение unique_author_user_following. Удаляются они явным
+DELETE по FEED_BATCH_SIZE авторов. Сигналы Follow при этом не
+отправляются, поэтому ленты и кеш обновляются здесь же, один раз на всю
+пачку.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from core import jobs
+from core.cache import bump_version
+
+from . import caching, feeds
+from .models import FeedItem, Follow, User
+
+
+def authors(usernames):
+    """Пользователи с именами из usernames."""
+    return User.objects.filter(username__in=set(usernames))
+
+
+def follow_many(user, authors):
+    """Подписывает user на authors; возвращает число новых подписок."""
+    author_ids = list(
+        authors.exclude(pk=user.pk)
+        .exclude(following__user=user)
+        .values_list('pk', flat=True)
+    )
+    if not author_ids:
+        return 0
+    size = settings.FEED_BATCH_SIZE
+    with transaction.atomic():
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=pk) for pk in author_ids],
+            batch_size=size,
+            ignore_conflicts=True,
+        )
+        for start in range(0, len(author_ids), size):
+            jobs.enqueue(
+                feeds.backfill_follows,
+                user_id=user.pk,
+                author_ids=author_ids[start:start + size],
+            )
+    bump_version(caching.follow_scope(user.pk))
+    return len(author_ids)
+
+
+def unfollow_many(user, authors):
+    """Отписывает user от authors; возвращает число удалённых подписок."""
+    # Явный DELETE, а не QuerySet.delete(): тот выбирает строки и на
+    # каждую шлёт follow_deleted, который чистит ленту по одному автору.
+    author_ids = list(authors.values_list('pk', flat=True))
+    if not author_ids:
+        return 0
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    size = settings.FEED_BATCH_SIZE
+    deleted = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(author_ids), size):
+            chunk = author_ids[start:start + size]
+            FeedItem.objects.filter(user=user, author_id__in=chunk).delete()
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {table} '
+                f'WHERE user_id = %s AND author_id IN ({placeholders})',
+                [user.pk, *chunk],
+            )
+            deleted += cursor.rowcount
+    if deleted:
+        bump_version(caching.follow_scope(user.pk))
+    return deleted
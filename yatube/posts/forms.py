@@ -1,5 +1,12 @@
+import re
+
 from django import forms
-from .models import Post, Comment
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+
+from . import uploads
+from .models import Comment, Group, Post
 
 
 class PostForm(forms.ModelForm):
@@ -7,8 +14,87 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Обрезанный при загрузке файл не картинка: убираем его до
+        # проверки поля, а ошибку размера выдаёт clean_image.
+        self.oversized = isinstance(
+            self.files.get('image'), uploads.OversizedUpload
+        )
+        if self.oversized:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if self.oversized:
+            raise forms.ValidationError(
+                'Файл больше %(limit)s.',
+                code='too_large',
+                params={
+                    'limit': filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)
+                },
+            )
+        if not isinstance(image, UploadedFile):
+            return image
+        width, height = image.image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка %(width)s×%(height)s слишком большая, допустимо '
+                'не больше %(limit)s мегапикселей.',
+                code='too_many_pixels',
+                params={
+                    'width': width,
+                    'height': height,
+                    'limit': settings.IMAGE_UPLOAD_MAX_PIXELS // 10 ** 6,
+                },
+            )
+        return uploads.normalize(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class BulkFollowForm(forms.Form):
+    FOLLOW = 'follow'
+    UNFOLLOW = 'unfollow'
+
+    action = forms.ChoiceField(choices=(
+        (FOLLOW, 'Подписаться'),
+        (UNFOLLOW, 'Отписаться'),
+    ))
+    usernames = forms.CharField(
+        required=False,
+        widget=forms.Textarea,
+        help_text='Имена через пробел, запятую или с новой строки',
+    )
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        to_field_name='slug',
+        help_text='Все авторы постов группы',
+    )
+
+    def clean_usernames(self):
+        usernames = set(re.split(r'[\s,]+', self.cleaned_data['usernames']))
+        usernames.discard('')
+        limit = settings.FOLLOW_BULK_LIMIT
+        if len(usernames) > limit:
+            raise forms.ValidationError(
+                'Не больше %(limit)s имён за раз.',
+                code='too_many',
+                params={'limit': limit},
+            )
+        return usernames
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('usernames') and not cleaned_data.get('group'):
+            if not self.has_error('usernames'):
+                raise forms.ValidationError(
+                    'Укажите имена авторов или группу.', code='empty'
+                )
+        return cleaned_data
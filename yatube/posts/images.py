@@ -0,0 +1,160 @@
+"""Подготовка миниатюр картинок постов.
+
+Каждая картинка нарезается в нескольких ширинах (THUMBNAIL_WIDTHS) и
+форматах (THUMBNAIL_FORMATS), а тег {% responsive_image %} отдаёт их
+браузеру через srcset. Миниатюры создаёт фоновая задача (core.jobs)
+сразу после сохранения поста и кладёт в кеш их готовый список: рендер
+шаблона берёт его одним обращением к кешу и картинку не обрабатывает.
+Пока списка нет (задача ещё не выполнилась), выводится оригинал.
+
+Одинаковые картинки хранятся одним файлом (core.storage), поэтому файл
+и его миниатюры удаляются, только когда на него не ссылается ни один пост.
+"""
+import hashlib
+import logging
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import features
+from sorl.thumbnail import delete, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.images import ImageFile
+
+from core import jobs
+from core.storage import file_lock
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_KEY = 'thumbnails:{}:{}'
+
+CONTENT_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+
+def _is_supported(format):
+    # sorl-thumbnail не знает расширения для новых форматов (AVIF), а
+    # Pillow может быть собран без их кодеков.
+    if format not in EXTENSIONS or format not in CONTENT_TYPES:
+        return False
+    module = format.lower()
+    if module in features.modules:
+        return features.check_module(module)
+    return True
+
+
+@lru_cache(maxsize=None)
+def _formats(configured):
+    return [format for format in configured if _is_supported(format)]
+
+
+def formats():
+    """Доступные форматы миниатюр, от предпочтительного к запасному."""
+    return _formats(tuple(settings.THUMBNAIL_FORMATS)) or ['JPEG']
+
+
+def dimensions():
+    """Размеры миниатюр (ширина, высота) по возрастанию ширины."""
+    width, height = settings.THUMBNAIL_ASPECT
+    return [
+        (size, round(size * height / width))
+        for size in sorted(settings.THUMBNAIL_WIDTHS)
+    ]
+
+
+def presets():
+    """Все варианты миниатюр: (формат, ширина, геометрия, опции)."""
+    return [
+        (format, width, f'{width}x{height}',
+         {'crop': 'center', 'upscale': True, 'format': format})
+        for format in formats()
+        for width, height in dimensions()
+    ]
+
+
+def _variants_key(name):
+    # Другие ширины или форматы — другой список миниатюр.
+    signature = hashlib.md5(repr(presets()).encode()).hexdigest()[:8]
+    return VARIANTS_KEY.format(signature, name)
+
+
+def variants(image):
+    """Миниатюры картинки для <picture>: источники по форматам и
+    запасная картинка в последнем формате. Пока pregenerate их не
+    подготовил — только оригинал."""
+    return cache.get(_variants_key(image.name)) or {'src': image.url}
+
+
+def _build_variants(source):
+    sources = {}
+    for format, width, geometry, options in presets():
+        thumbnail = get_thumbnail(source, geometry, **options)
+        sources.setdefault(format, []).append((width, thumbnail))
+    *modern, (_, fallback) = sources.items()
+    width, height = dimensions()[-1]
+    return {
+        'sources': [
+            {'type': CONTENT_TYPES[format], 'srcset': _srcset(thumbnails)}
+            for format, thumbnails in modern
+        ],
+        'src': fallback[-1][1].url,
+        'srcset': _srcset(fallback),
+        'width': width,
+        'height': height,
+    }
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {width}w' for width, thumbnail in thumbnails
+    )
+
+
+@jobs.task
+def pregenerate(name):
+    """Создаёт все варианты миниатюр для картинки name."""
+    try:
+        if not default_storage.exists(name):
+            return
+        # Миниатюры sorl-thumbnail привязаны к хранилищу оригинала:
+        # оно должно совпадать с хранилищем post.image в шаблонах.
+        source = ImageFile(name, default_storage)
+        cache.set(_variants_key(name), _build_variants(source), None)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры для %s', name)
+
+
+def schedule(name):
+    """Ставит подготовку миниатюр в очередь фоновых задач."""
+    jobs.enqueue(pregenerate, key=f'thumbnails:{name}', name=name)
+
+
+def references(name):
+    """Сколько постов ссылаются на файл name."""
+    return Post.objects.filter(image=name).count()
+
+
+def _release(name):
+    try:
+        # Под блокировкой: иначе ContentAddressedStorage может проверить
+        # файл новой загрузки между подсчётом ссылок и удалением.
+        with file_lock(name):
+            if not references(name):
+                cache.delete(_variants_key(name))
+                delete(ImageFile(name, default_storage))
+    except Exception:
+        logger.exception('Не удалось удалить файл %s', name)
+
+
+def release(name):
+    """Удаляет файл и его миниатюры после коммита, если он больше не
+    нужен ни одному посту."""
+    transaction.on_commit(partial(_release, name))
@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа, число запросов и память страниц с '
+            'лентами и сравнивает их с базовыми замерами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON с базовыми замерами для сравнения',
+        )
+        parser.add_argument(
+            '--save', help='Куда сохранить замеры как новые базовые',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=10,
+            help='Допустимое ухудшение метрики, %%',
+        )
+
+    def handle(self, *args, **options):
+        results = benchmarks.run(
+            options['requests'], options['warmup'], options['cold']
+        )
+        for name, metrics in results.items():
+            values = '  '.join(
+                f'{metric}={value}' for metric, value in metrics.items()
+            )
+            self.stdout.write(f'{name:<14}{values}')
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+        if not options['baseline']:
+            return
+        with open(options['baseline']) as file:
+            baseline = json.load(file)
+        rows = benchmarks.compare(results, baseline, options['tolerance'])
+        regressions = 0
+        for name, metric, before, after, change, regressed in rows:
+            line = (
+                f'{name:<14}{metric:<11}'
+                f'{before} -> {after} ({change:+.1f}%)'
+            )
+            if regressed:
+                regressions += 1
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'Ухудшилось метрик: {regressions}')
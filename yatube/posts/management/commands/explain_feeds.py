@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import query_plans
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов лент и завершается с ошибкой, '
+            'если какой-то из них проходит всю таблицу или сортирует '
+            'результат во временной таблице')
+
+    def handle(self, *args, **options):
+        failed = 0
+        for name, plan, problems in query_plans.check():
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}:\n{plan}')
+            if not problems:
+                self.stdout.write(f'{name:<14}OK')
+                continue
+            failed += 1
+            for description, line in problems:
+                self.stdout.write(self.style.ERROR(
+                    f'{name:<14}{description}: {line}'
+                ))
+        if failed:
+            raise CommandError(f'Запросов с плохим планом: {failed}')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в каталог'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson'
+        )
+        parser.add_argument(
+            '--media', action='store_true',
+            help='Скопировать и картинки постов',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        written = transfer.export(
+            options['directory'],
+            options['format'],
+            options['media'],
+            options['batch_size'],
+            log=self.stderr.write,
+        )
+        for name, count in written.items():
+            self.stdout.write(f'{name}: {count}')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу данными для замеров скорости (benchmark)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=int, default=50,
+            help='Сколько подписок у каждого пользователя',
+        )
+        parser.add_argument(
+            '--comments', type=int, default=3,
+            help='Среднее число комментариев к посту',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=10,
+            help='Сколько постов получат длинные ветки комментариев',
+        )
+        parser.add_argument('--thread-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        benchmarks.generate(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            follows=options['follows'],
+            comments=options['comments'],
+            threads=options['threads'],
+            thread_size=options['thread_size'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, посты, комментарии и подписки из выгрузки '
+            'export_content')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson'
+        )
+        parser.add_argument(
+            '--media', action='store_true',
+            help='Загрузить и картинки постов из каталога media',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            loaded = transfer.load(
+                options['directory'],
+                options['format'],
+                options['media'],
+                options['batch_size'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        for name, count in loaded.items():
+            self.stdout.write(f'{name}: {count}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и комментариев'
+
+    def handle(self, *args, **options):
+        reconciled = counters.reconcile()
+        self.stdout.write(f'Пересчитано счётчиков: {reconciled}')
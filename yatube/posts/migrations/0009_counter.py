@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('posts', 'Все посты'), ('group_posts', 'Посты группы'), ('author_posts', 'Посты автора'), ('post_comments', 'Комментарии поста')], max_length=20, verbose_name='Область')),
+                ('object_id', models.PositiveIntegerField(default=0, verbose_name='ID объекта')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Счётчик',
+                'verbose_name_plural': 'Счётчики',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='counter',
+            constraint=models.UniqueConstraint(fields=('scope', 'object_id'), name='unique_counter_scope_object'),
+        ),
+    ]
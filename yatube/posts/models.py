@@ -22,6 +22,8 @@ class Post(models.Model):
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор',
+        # Покрыт составным индексом post_author_date_idx.
+        db_index=False,
     )
     group = models.ForeignKey(
         'Group',
@@ -29,20 +31,36 @@ class Post(models.Model):
         null=True,
         related_name='posts',
         on_delete=models.SET_NULL,
+        db_index=False,
         verbose_name='Группа',
         help_text='Выберите группу',
     )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        db_index=True,
     )
 
     def __str__(self):
         return self.text[:NUM_SIGN]
 
     class Meta:
-        ordering = ['-pub_date']
+        # id разрешает равные даты: порядок однозначен, и страницы не
+        # пересекаются.
+        ordering = ['-pub_date', '-id']
+        # Ленты автора и группы: фильтр по ним и сортировка по дате с id
+        # для однозначного порядка берутся из индекса без сортировки.
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -79,6 +97,13 @@ class Comment(models.Model):
     )
 
     class Meta:
+        ordering = ['created', 'pk']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарий'
 
@@ -92,18 +117,102 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
         verbose_name='Автор',
+        db_index=False,
     )
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
         verbose_name='Пользователь',
+        db_index=False,
     )
 
     class Meta:
+        # Подписки пользователя ищутся по уникальному (user, author),
+        # подписчики автора — по индексу (author, user).
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_author_user_following'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_user_post_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_item_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_item_user_author_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class Counter(models.Model):
+    """Денормализованный счётчик постов и комментариев."""
+    POSTS = 'posts'
+    GROUP_POSTS = 'group_posts'
+    AUTHOR_POSTS = 'author_posts'
+    POST_COMMENTS = 'post_comments'
+    SCOPES = (
+        (POSTS, 'Все посты'),
+        (GROUP_POSTS, 'Посты группы'),
+        (AUTHOR_POSTS, 'Посты автора'),
+        (POST_COMMENTS, 'Комментарии поста'),
+    )
+
+    scope = models.CharField('Область', max_length=20, choices=SCOPES)
+    object_id = models.PositiveIntegerField('ID объекта', default=0)
+    value = models.IntegerField('Значение', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'object_id'],
+                name='unique_counter_scope_object'
+            )
+        ]
+        verbose_name = 'Счётчик'
+        verbose_name_plural = 'Счётчики'
+
+    def __str__(self):
+        return f'{self.scope}:{self.object_id}={self.value}'
@@ -0,0 +1,102 @@
+"""Проверка планов запросов лент через EXPLAIN.
+
+Запросы строятся так же, как во views, но для несуществующих объектов:
+от конкретного id план не зависит. Плохим считается план с полным
+проходом по таблице или индексу или сортировкой во временной структуре —
+такие запросы замедляются вместе с ростом таблиц. Используется командой
+explain_feeds.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from . import feeds, views
+from .models import Follow, Group, Post
+from .paginators import CursorPaginator, KeysetChunk
+
+User = get_user_model()
+
+FAKE_PK = 0
+FULL_SCAN = 'полный проход'
+SORT = 'сортировка'
+# Признаки плохого плана: (шаблон строки, описание). В SQLite проход
+# допустим только по покрывающему индексу.
+PROBLEMS = {
+    'sqlite': [
+        (re.compile(r'\bSCAN\b(?!.*\bUSING COVERING INDEX\b)'), FULL_SCAN),
+        (re.compile(r'TEMP B-TREE'), SORT),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan'), FULL_SCAN),
+        (re.compile(r'(^|->)\s*Sort\b'), SORT),
+    ],
+}
+# Запросы, у которых проход идёт в порядке ORDER BY и обрывается на
+# LIMIT: читается одна страница, а не вся таблица. Если при этом в плане
+# есть сортировка, порядок берётся не из прохода и проход полный.
+ORDERED_SCANS = {'index', 'index_cursor'}
+# Запросы, сортирующие ограниченное число строк: слияние ленты со
+# знаменитостями сортирует не больше FEED_MERGE_LIMIT строк на ветку.
+BOUNDED_SORTS = {'follow_merged'}
+
+
+def feed_queries():
+    """Запросы лент: {имя: queryset}."""
+    user = User(pk=FAKE_PK)
+    group = Group(pk=FAKE_PK)
+    post = Post(pk=FAKE_PK)
+    page = views.QUANTITY_POSTS
+    index = Post.objects.select_related('group', 'author')
+    return {
+        'index': index[:page],
+        'index_cursor': CursorPaginator(index, page).object_list[:page],
+        'group_posts': group.posts.all()[:page],
+        'profile': user.posts.all()[:page],
+        'follow_index': feeds.feed_posts(user, []).select_related(
+            'group', 'author'
+        )[:page],
+        # Две знаменитости: ветка на каждую, как при чтении.
+        'follow_merged': feeds.feed_posts(
+            user, [FAKE_PK, FAKE_PK + 1]
+        ).select_related('group', 'author')[:page],
+        'post_comments': KeysetChunk(
+            post.comments.select_related('author'),
+            'created',
+            None,
+            views.COMMENTS_PER_PAGE,
+        ).queryset[:views.COMMENTS_PER_PAGE],
+        'followers': Follow.objects.filter(
+            author_id=FAKE_PK
+        ).values_list('user_id', flat=True),
+    }
+
+
+def problems(plan, vendor=None):
+    """Строки плана с признаками полного прохода или сортировки."""
+    patterns = PROBLEMS.get(vendor or connection.vendor, [])
+    found = []
+    for line in plan.splitlines():
+        for pattern, description in patterns:
+            if pattern.search(line):
+                found.append((description, line.strip()))
+    return found
+
+
+def check():
+    """Планы всех запросов лент: [(имя, план, проблемы)]."""
+    result = []
+    for name, queryset in feed_queries().items():
+        plan = queryset.explain()
+        found = problems(plan)
+        allowed = set()
+        if name in ORDERED_SCANS and SORT not in dict(found):
+            allowed.add(FULL_SCAN)
+        if name in BOUNDED_SORTS:
+            allowed.add(SORT)
+        result.append((
+            name,
+            plan,
+            [problem for problem in found if problem[0] not in allowed],
+        ))
+    return result
@@ -0,0 +1,136 @@
+"""Полнотекстовый поиск по постам.
+
+Тексты постов индексируются в виртуальной таблице SQLite FTS5, которую
+держат в актуальном состоянии сигналы сохранения и удаления постов
+(сохранённый пост индексируется фоновой задачей).
+Результаты ранжируются по BM25. На других СУБД поиск откатывается к
+LIKE по тексту.
+"""
+import re
+
+from django.db import connection, connections, router
+from django.db.models.expressions import RawSQL
+
+from core.jobs import task
+
+from .models import Post
+
+INDEX_TABLE = 'posts_post_fts'
+MATCH_SQL = f'SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s'
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_query(text):
+    """Запрос FTS5 из пользовательской строки: все слова, последнее —
+    как префикс."""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_post(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [post.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+@task
+def reindex_post(post_id):
+    """Фоновая задача: индексирует пост в его текущем состоянии."""
+    post = Post.objects.filter(pk=post_id).only('pk', 'text').first()
+    if post is None:
+        unindex_post(post_id)
+        return
+    index_post(post)
+
+
+def unindex_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def rebuild():
+    """Заново заполняет индекс по всем постам."""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+
+
+def filter_posts(queryset, text):
+    """Посты queryset, подходящие под строку поиска (без ранжирования)."""
+    query = build_query(text)
+    if query is None:
+        return queryset.none()
+    if not is_available():
+        return queryset.filter(text__icontains=text)
+    return queryset.filter(pk__in=RawSQL(MATCH_SQL, [query]))
+
+
+class SearchResults:
+    """Ранжированные результаты поиска для Paginator.
+
+    Paginator берёт у результатов count() и срез; оба обращения идут в
+    индекс, а посты подгружаются только для выбранной страницы.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.query = build_query(text)
+
+    def count(self):
+        if self.query is None:
+            return 0
+        if not is_available():
+            return filter_posts(Post.objects.all(), self.text).count()
+        with connections[router.db_for_read(Post)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {INDEX_TABLE} '
+                f'WHERE {INDEX_TABLE} MATCH %s',
+                [self.query],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults supports only slicing')
+        if self.query is None:
+            return []
+        posts = Post.objects.select_related('author', 'group')
+        if not is_available():
+            return list(filter_posts(posts, self.text)[index])
+        offset = index.start or 0
+        with connections[router.db_for_read(Post)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {INDEX_TABLE} '
+                f'WHERE {INDEX_TABLE} MATCH %s '
+                f'ORDER BY bm25({INDEX_TABLE}) LIMIT %s OFFSET %s',
+                [self.query, index.stop - offset, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        found = posts.in_bulk(ids)
+        return [found[pk] for pk in ids if pk in found]
@@ -0,0 +1,199 @@
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from core import jobs
+from core.cache import bump_version
+
+from . import caching, counters, feeds, images, search
+from .models import Comment, Counter, Follow, Group, Post, User
+
+UNKNOWN = object()
+
+
+def invalidate_post(post, author_ids, group_ids):
+    scopes = [caching.INDEX, caching.post_scope(post.pk)]
+    # Число постов автора и группы показывают страницы их постов.
+    scopes.extend(
+        caching.author_id_scope(pk) for pk in author_ids - {UNKNOWN, None}
+    )
+    scopes.extend(
+        caching.group_id_scope(pk) for pk in group_ids - {UNKNOWN, None}
+    )
+    usernames = User.objects.filter(
+        pk__in=author_ids - {UNKNOWN, None}
+    ).values_list('username', flat=True)
+    scopes.extend(caching.author_scope(username) for username in usernames)
+    slugs = Group.objects.filter(
+        pk__in=group_ids - {UNKNOWN, None}
+    ).values_list('slug', flat=True)
+    scopes.extend(caching.group_scope(slug) for slug in slugs)
+    bump_version(*scopes)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_scopes(sender, instance, **kwargs):
+    # Отложенные поля не трогаем, чтобы не вызвать лишний запрос.
+    instance._saved_scopes = (
+        instance.__dict__.get('author_id', UNKNOWN),
+        instance.__dict__.get('group_id', UNKNOWN),
+    )
+    image = instance.__dict__.get('image', UNKNOWN)
+    instance._saved_image = image if image is UNKNOWN else str(image or '')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_author_id, old_group_id = instance._saved_scopes
+    if created:
+        counters.change(Counter.POSTS)
+        old_author_id = old_group_id = None
+    if old_author_id not in (UNKNOWN, instance.author_id):
+        counters.change(Counter.AUTHOR_POSTS, old_author_id, -1)
+        counters.change(Counter.AUTHOR_POSTS, instance.author_id)
+    if old_group_id not in (UNKNOWN, instance.group_id):
+        counters.change(Counter.GROUP_POSTS, old_group_id, -1)
+        counters.change(Counter.GROUP_POSTS, instance.group_id)
+    invalidate_post(
+        instance,
+        {old_author_id, instance.author_id},
+        {old_group_id, instance.group_id},
+    )
+    jobs.enqueue(
+        search.reindex_post, key=f'search:{instance.pk}', post_id=instance.pk
+    )
+    old_image = instance._saved_image
+    if instance.image.name != old_image:
+        if instance.image:
+            images.schedule(instance.image.name)
+        if old_image not in (UNKNOWN, '') and not created:
+            images.release(old_image)
+    if created:
+        jobs.enqueue(
+            feeds.fan_out_post,
+            key=f'fan_out:{instance.pk}',
+            post_id=instance.pk,
+        )
+    instance._saved_scopes = (instance.author_id, instance.group_id)
+    instance._saved_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(Counter.POSTS, delta=-1)
+    counters.change(Counter.AUTHOR_POSTS, instance.author_id, -1)
+    counters.change(Counter.GROUP_POSTS, instance.group_id, -1)
+    counters.discard(Counter.POST_COMMENTS, instance.pk)
+    search.unindex_post(instance.pk)
+    if instance.image:
+        images.release(instance.image.name)
+    invalidate_post(instance, {instance.author_id}, {instance.group_id})
+
+
+def invalidate_group(group, usernames):
+    """Страницы, где выводятся название или slug группы: лента, группа
+    под старым и новым slug, пост, профили авторов группы."""
+    slugs = {group._saved_slug, group.slug} - {None}
+    bump_version(
+        caching.INDEX,
+        caching.group_id_scope(group.pk),
+        *(caching.group_scope(slug) for slug in slugs),
+        *(caching.author_scope(username) for username in usernames),
+    )
+
+
+def _group_authors(group):
+    return User.objects.filter(
+        posts__group=group
+    ).values_list('username', flat=True).distinct()
+
+
+@receiver(post_init, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._saved_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        invalidate_group(instance, _group_authors(instance))
+    instance._saved_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов уже не будет группы: авторов берём заранее.
+    instance._authors = list(_group_authors(instance))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    counters.discard(Counter.GROUP_POSTS, instance.pk)
+    invalidate_group(instance, getattr(instance, '_authors', []))
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._saved_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    """Имя пользователя выводят лента, страницы групп и постов автора,
+    его профиль под старым и новым username и комментарии к постам."""
+    old_username = instance._saved_username
+    instance._saved_username = instance.username
+    # При входе сохраняется только last_login: имя не меняется.
+    if raw or created or (update_fields and update_fields <= {'last_login'}):
+        return
+    usernames = {old_username, instance.username} - {None}
+    slugs = Group.objects.filter(
+        posts__author=instance
+    ).values_list('slug', flat=True).distinct()
+    commented = Comment.objects.filter(
+        author=instance
+    ).values_list('post_id', flat=True).distinct()
+    bump_version(
+        caching.INDEX,
+        caching.author_id_scope(instance.pk),
+        *(caching.author_scope(username) for username in usernames),
+        *(caching.group_scope(slug) for slug in slugs),
+        *(caching.post_scope(post_id) for post_id in commented),
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change(Counter.POST_COMMENTS, instance.post_id)
+    bump_version(caching.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change(Counter.POST_COMMENTS, instance.post_id, -1)
+    bump_version(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        jobs.enqueue(
+            feeds.backfill_follow,
+            key=f'backfill:{instance.user_id}:{instance.author_id}',
+            user_id=instance.user_id,
+            author_id=instance.author_id,
+        )
+        bump_version(caching.follow_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feeds.prune(instance.user_id, instance.author_id)
+    bump_version(caching.follow_scope(instance.user_id))
@@ -0,0 +1,28 @@
+import logging
+
+from django import template
+from django.conf import settings
+
+from posts import images
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/picture.html')
+def responsive_image(image, sizes=None):
+    """Картинка поста с вариантами по ширине и формату.
+
+    {% responsive_image post.image %}
+    {% responsive_image post.image sizes="100vw" %}
+    """
+    context = {'sizes': sizes or settings.THUMBNAIL_SIZES}
+    if not image:
+        return context
+    try:
+        context.update(images.variants(image))
+    except Exception:
+        # Как и {% thumbnail %}: битая картинка не должна ронять страницу.
+        logger.exception('Не удалось получить миниатюры для %s', image)
+    return context
@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import benchmarks
+from posts.models import Comment, FeedItem, Follow, Post
+
+PAGES = ('index', 'group_posts', 'profile', 'follow_index', 'post_detail')
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmarks.generate(
+            users=10, groups=2, posts=30, follows=5, comments=1,
+            threads=1, thread_size=25, log=lambda message: None,
+        )
+
+    def test_generate_creates_requested_volumes(self):
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(FeedItem.objects.exists())
+        self.assertGreaterEqual(Comment.objects.count(), 25)
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertEqual(len(set(dates)), 30)
+
+    def test_run_measures_every_page(self):
+        results = benchmarks.run(requests=2, warmup=0, cold=True)
+        self.assertEqual(tuple(results), PAGES)
+        for metrics in results.values():
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+            self.assertGreater(metrics['queries'], 0)
+
+    def test_command_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            with open(baseline, 'w') as file:
+                json.dump({'index': {'queries': 0.5}}, file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark', requests=1, warmup=0, baseline=baseline,
+                    stdout=StringIO(),
+                )
@@ -0,0 +1,63 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import counters
+from posts.models import Comment, Counter, Group, Post
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='auth')
+        cls.other_user = User.objects.create(username='Yana')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group
+        )
+
+    def assertCounters(self):
+        expected = {
+            (Counter.POSTS, 0): Post.objects.count(),
+            (Counter.AUTHOR_POSTS, self.user.pk):
+                Post.objects.filter(author=self.user).count(),
+            (Counter.AUTHOR_POSTS, self.other_user.pk):
+                Post.objects.filter(author=self.other_user).count(),
+            (Counter.GROUP_POSTS, self.group.pk):
+                Post.objects.filter(group=self.group).count(),
+            (Counter.GROUP_POSTS, self.other_group.pk):
+                Post.objects.filter(group=self.other_group).count(),
+            (Counter.POST_COMMENTS, self.post.pk):
+                self.post.comments.count(),
+        }
+        for (scope, object_id), value in expected.items():
+            with self.subTest(scope=scope, object_id=object_id):
+                self.assertEqual(counters.get(scope, object_id), value)
+
+    def test_counters_follow_saves_and_deletes(self):
+        self.assertCounters()
+        post = Post.objects.create(
+            text='Второй пост', author=self.user, group=self.group
+        )
+        comment = Comment.objects.create(
+            post=self.post, author=self.other_user, text='Комментарий'
+        )
+        self.assertCounters()
+        post.group = self.other_group
+        post.author = self.other_user
+        post.save()
+        self.assertCounters()
+        comment.delete()
+        post.delete()
+        self.assertCounters()
+
+    def test_reconcile_fixes_drift(self):
+        self.assertCounters()
+        Counter.objects.update(value=100)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertCounters()
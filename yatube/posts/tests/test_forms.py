@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -86,6 +87,17 @@ class PostFormTests(TestCase):
             ).exists()
         )
 
+    def test_post_not_saved_without_its_jobs(self):
+        post_count = Post.objects.count()
+        with mock.patch(
+            'posts.signals.jobs.enqueue', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост без задач'},
+            )
+        self.assertEqual(Post.objects.count(), post_count)
+
     def test_post_edit(self):
         form_data = {
             'text': 'Тестовый текст новый',
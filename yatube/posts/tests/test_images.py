@@ -0,0 +1,164 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+
+from posts import images
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(name='test.jpg', size=(1200, 800), format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format=format)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPregenerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # sorl-thumbnail хранит сведения о миниатюрах и в кеше, а картинки
+        # с тем же именем загружают и другие тесты.
+        cache.clear()
+
+    def test_saving_image_schedules_thumbnails(self):
+        with mock.patch('posts.images.jobs.enqueue') as enqueue:
+            post = Post.objects.create(
+                text='Текст', author=self.user, image=make_image()
+            )
+            Post.objects.get(pk=post.pk).save()
+            Post.objects.create(text='Без картинки', author=self.user)
+        scheduled = [
+            call for call in enqueue.call_args_list
+            if call[0] == (images.pregenerate,)
+        ]
+        self.assertEqual(scheduled, [mock.call(
+            images.pregenerate,
+            key=f'thumbnails:{post.image.name}',
+            name=post.image.name,
+        )])
+
+    def test_pregenerate_fills_thumbnail_store(self):
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=make_image()
+        )
+        images.pregenerate(post.image.name)
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            for _, _, geometry, options in images.presets():
+                thumbnail = get_thumbnail(post.image, geometry, **options)
+                self.assertTrue(thumbnail.exists())
+        get_image.assert_not_called()
+
+    def test_pregenerate_skips_missing_files(self):
+        with mock.patch('posts.images.get_thumbnail') as get_thumbnail:
+            images.pregenerate('posts/missing.jpg')
+        get_thumbnail.assert_not_called()
+
+    @override_settings(
+        THUMBNAIL_WIDTHS=[640, 320], THUMBNAIL_FORMATS=['PNG', 'JPEG']
+    )
+    def test_responsive_image_lists_every_width(self):
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=make_image()
+        )
+        html = Template(
+            '{% load post_images %}{% responsive_image post.image %}'
+        ).render(Context({'post': post}))
+        self.assertIn('<source type="image/png"', html)
+        self.assertIn('width="640" height="226"', html)
+        img = html[html.index('<img'):]
+        self.assertRegex(img, r'srcset="\S+\.jpg 320w, \S+\.jpg 640w"')
+
+    def test_responsive_image_before_pregenerate_shows_original(self):
+        with mock.patch('posts.images.jobs.enqueue'):
+            post = Post.objects.create(
+                text='Текст', author=self.user, image=make_image()
+            )
+        with mock.patch('posts.images.get_thumbnail') as get_thumbnail:
+            html = Template(
+                '{% load post_images %}{% responsive_image post.image %}'
+            ).render(Context({'post': post}))
+        get_thumbnail.assert_not_called()
+        self.assertIn(f'src="{post.image.url}"', html)
+        self.assertNotIn('srcset', html)
+        images.pregenerate(post.image.name)
+        html = Template(
+            '{% load post_images %}{% responsive_image post.image %}'
+        ).render(Context({'post': post}))
+        self.assertIn('srcset', html)
+
+    def test_unsupported_formats_are_skipped(self):
+        with override_settings(THUMBNAIL_FORMATS=['AVIF', 'HEIC', 'JPEG']):
+            self.assertEqual(images.formats(), ['JPEG'])
+        with override_settings(THUMBNAIL_FORMATS=['AVIF']):
+            self.assertEqual(images.formats(), ['JPEG'])
+
+    def test_responsive_image_without_image_renders_nothing(self):
+        post = Post.objects.create(text='Без картинки', author=self.user)
+        html = Template(
+            '{% load post_images %}{% responsive_image post.image %}'
+        ).render(Context({'post': post}))
+        self.assertEqual(html.strip(), '')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SharedImageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            'posts.images.transaction.on_commit', side_effect=lambda f: f()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_identical_uploads_share_file_until_last_post_deleted(self):
+        first = Post.objects.create(
+            text='Первый', author=self.user, image=make_image('a.jpg')
+        )
+        second = Post.objects.create(
+            text='Второй', author=self.user, image=make_image('b.jpg')
+        )
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(images.references(name), 2)
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_image_is_released(self):
+        post = Post.objects.create(
+            text='Текст', author=self.user, image=make_image()
+        )
+        old_name = post.image.name
+        post.image = make_image(size=(10, 10))
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(post.image.name))
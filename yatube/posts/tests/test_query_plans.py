@@ -0,0 +1,48 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import TestCase
+
+from posts import query_plans
+from posts.models import Post
+
+
+class QueryPlanTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        output = StringIO()
+        call_command('explain_feeds', stdout=output)
+        for name in query_plans.feed_queries():
+            self.assertIn(f'{name:<14}OK', output.getvalue())
+
+    def test_scan_and_temp_sort_are_problems(self):
+        plan = (
+            '2 0 0 SCAN posts_post\n'
+            '3 0 0 SCAN posts_post USING INDEX posts_post_pub_date\n'
+            '4 0 0 SCAN posts_feeditem USING COVERING INDEX feed_idx\n'
+            '5 0 0 SEARCH posts_post USING INDEX post_author_date_idx\n'
+            '9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        )
+        self.assertEqual(
+            [description for description, _ in
+             query_plans.problems(plan, 'sqlite')],
+            [query_plans.FULL_SCAN, query_plans.FULL_SCAN, query_plans.SORT],
+        )
+        plan = 'Sort  (cost=1.0..1.1)\n  ->  Seq Scan on posts_post'
+        self.assertEqual(len(query_plans.problems(plan, 'postgresql')), 2)
+
+    def test_ordered_scan_allowed_only_without_sort(self):
+        plan = (
+            '3 0 0 SCAN posts_post USING INDEX posts_post_pub_date\n'
+            '9 0 0 USE TEMP B-TREE FOR ORDER BY'
+        )
+        queries = {'index': Post.objects.none()}
+        with mock.patch.object(
+            query_plans, 'feed_queries', return_value=queries
+        ), mock.patch.object(QuerySet, 'explain', return_value=plan):
+            [(_, _, found)] = query_plans.check()
+        self.assertEqual(
+            [description for description, _ in found],
+            [query_plans.FULL_SCAN, query_plans.SORT],
+        )
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+from posts.views import QUANTITY_POSTS
+
+User = get_user_model()
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='auth')
+        cls.post = Post.objects.create(
+            text='Сегодня в ПАРКЕ цвела сирень', author=cls.user
+        )
+        cls.other = Post.objects.create(
+            text='Сирень, сирень и ещё раз сирень', author=cls.user
+        )
+        Post.objects.create(text='Ничего общего', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj'])
+
+    def test_ranked_search(self):
+        self.assertEqual(self.search('сирень'), [self.other, self.post])
+        self.assertEqual(self.search('парк'), [self.post])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Сегодня шёл дождь'
+        post.save()
+        self.assertEqual(self.search('парк'), [])
+        self.assertEqual(self.search('дождь'), [post])
+        Post.objects.get(pk=self.other.pk).delete()
+        self.assertEqual(self.search('сирень'), [])
+
+    def test_results_are_paginated(self):
+        Post.objects.bulk_create(
+            Post(text='Пагинация', author=self.user)
+            for _ in range(QUANTITY_POSTS + 1)
+        )
+        search.rebuild()
+        self.assertEqual(len(self.search('пагинация')), QUANTITY_POSTS)
+        self.assertEqual(len(self.search('пагинация', page=2)), 1)
+
+    def test_admin_search_uses_index(self):
+        found = search.filter_posts(Post.objects.all(), 'ПАРК')
+        self.assertEqual(list(found), [self.post])
@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from core.cache import get_version
+from posts import caching, counters, feeds, transfer
+from posts.models import Comment, Counter, FeedItem, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Пост, с "кавычками"\nи переносом',
+            author=author,
+            group=group,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        Post.objects.create(text='Без группы', author=reader)
+        Comment.objects.create(post=cls.post, author=reader, text='Ок')
+        Follow.objects.create(user=reader, author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def round_trip(self, format):
+        dates = dict(Post.objects.values_list('pk', 'pub_date'))
+        created = Comment.objects.get().created
+        image = self.post.image.name
+        transfer.export(self.directory, format, media=True, batch_size=1)
+        for model in (Follow, Comment, Post, Group):
+            model.objects.all().delete()
+        User.objects.filter(username='reader').delete()
+        transfer.load(self.directory, format, media=True, batch_size=1)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, self.post.text)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.image.name, image)
+        self.assertEqual(dict(Post.objects.values_list('pk', 'pub_date')),
+                         dates)
+        self.assertEqual(
+            Post.objects.get(text='Без группы').author.username, 'reader'
+        )
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        self.assertEqual(post.comments.get().created, created)
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author__username='author'
+        ).exists())
+        self.assertTrue(FeedItem.objects.filter(post=post).exists())
+        self.assertEqual(counters.get(Counter.POSTS), 2)
+
+    def test_round_trip_ndjson(self):
+        self.round_trip('ndjson')
+
+    def test_round_trip_csv(self):
+        self.round_trip('csv')
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('export_content', self.directory, stdout=out)
+        self.assertIn('posts: 2', out.getvalue())
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, 'posts.ndjson'))
+        )
+        out = StringIO()
+        call_command('import_content', self.directory, stdout=out)
+        self.assertIn('posts: 2', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_export_skips_missing_images(self):
+        Post.objects.create(
+            text='Картинка потерялась',
+            author=self.post.author,
+            image='posts/lost.gif',
+        )
+        missing = []
+        written = transfer.export(
+            self.directory, media=True, log=missing.append
+        )
+        self.assertEqual(written['posts'], 3)
+        self.assertEqual(written['media'], 1)
+        self.assertEqual(missing, ['Нет файла картинки: posts/lost.gif'])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.directory, 'media', self.post.image.name
+        )))
+
+    def test_load_keeps_unrelated_cache(self):
+        transfer.export(self.directory, 'ndjson')
+        Post.objects.all().delete()
+        cache.set('unrelated', 1)
+        version = get_version(caching.INDEX, caching.group_scope('group'))
+        transfer.load(self.directory, 'ndjson')
+        self.assertEqual(cache.get('unrelated'), 1)
+        self.assertNotEqual(
+            get_version(caching.INDEX, caching.group_scope('group')), version
+        )
+
+    def test_rejects_image_outside_media(self):
+        transfer.export(self.directory, 'ndjson')
+        path = os.path.join(self.directory, 'posts.ndjson')
+        for image in ('/etc/passwd', '../../secret.gif', 'posts/../../x.gif'):
+            with self.subTest(image=image):
+                with open(path, 'w', encoding='utf-8') as file:
+                    file.write(json.dumps({
+                        'id': 999,
+                        'text': 'Пост',
+                        'pub_date': '2022-01-28T00:00:00+00:00',
+                        'author': 'author',
+                        'group': None,
+                        'image': image,
+                    }) + '\n')
+                with self.assertRaises(CommandError):
+                    call_command('import_content', self.directory)
+                self.assertFalse(Post.objects.filter(pk=999).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_load_recomputes_celebrities(self):
+        transfer.export(self.directory, 'ndjson')
+        Follow.objects.all().delete()
+        self.assertEqual(feeds.celebrity_ids(), frozenset())
+        transfer.load(self.directory, 'ndjson')
+        # У автора снова есть подписчик: больше FEED_FANOUT_LIMIT.
+        self.assertFalse(FeedItem.objects.exists())
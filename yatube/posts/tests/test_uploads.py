@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+from posts.uploads import SizeLimitUploadHandler
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+ORIENTATION = 0x0112
+
+
+def make_jpeg(size, orientation=None):
+    buffer = BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Картинка', 'image': image},
+        )
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_original_is_downscaled_rotated_and_stripped(self):
+        self.create_post(make_jpeg((400, 200), orientation=6))
+        post = Post.objects.get(text='Картинка')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn(ORIENTATION, image.getexif())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        response = self.create_post(make_jpeg((1000, 1000)))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=10 ** 6)
+    def test_too_many_pixels_is_rejected(self):
+        response = self.create_post(make_jpeg((2000, 1000)))
+        self.assertIn(
+            '2000×1000', response.context['form'].errors['image'][0]
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=10)
+    def test_handler_drops_data_over_limit(self):
+        handler = SizeLimitUploadHandler()
+        handler.new_file('image', 'big.jpg', 'image/jpeg', None)
+        self.assertEqual(handler.receive_data_chunk(b'x' * 8, 0), b'x' * 8)
+        self.assertIsNone(handler.receive_data_chunk(b'x' * 8, 8))
+        upload = handler.file_complete(16)
+        self.assertEqual(upload.size, 16)
+        self.assertEqual(upload.read(), b'')
@@ -1,17 +1,23 @@
 import shutil
 import tempfile
+import time
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 from django import forms
 
-from posts.models import Post, Group, Follow
+from posts import feeds
+from posts.models import Comment, FeedItem, Post, Group, Follow
 from posts.forms import PostForm
 from django.conf import settings
-from posts.views import QUANTITY_POSTS
+from posts.views import COMMENTS_PER_PAGE, QUANTITY_POSTS
 
 User = get_user_model()
 
@@ -57,6 +63,7 @@ class PostViewsTests(TestCase):
         cls.form = PostForm
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client_author = Client()
@@ -152,16 +159,28 @@ class PostViewsTests(TestCase):
     def test_cache_index_page_correct_context(self):
         response = self.authorized_client.get(reverse('posts:index'))
         content = response.content
-        post_id = PostViewsTests.post.id
-        instance = Post.objects.get(pk=post_id)
-        instance.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         new_response = self.authorized_client.get(reverse('posts:index'))
-        new_content = new_response.content
-        self.assertEqual(content, new_content)
-        cache.clear()
-        new_response_new = self.authorized_client.get(reverse('posts:index'))
-        new_content_new = new_response_new.content
-        self.assertNotEqual(content, new_content_new)
+        self.assertEqual(content, new_response.content)
+        Post.objects.get(pk=self.post.pk).delete()
+        new_response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(content, new_response.content)
+        self.assertNotContains(new_response, 'Без сигналов')
+
+    def test_cache_invalidated_per_scope(self):
+        group_url = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+        profile_url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.authorized_client.get(group_url)
+        self.authorized_client.get(profile_url)
+        Post.objects.create(
+            text='Пост в группе', author=self.user1, group=self.group
+        )
+        self.assertContains(
+            self.authorized_client.get(group_url), 'Пост в группе'
+        )
+        self.assertNotContains(
+            self.authorized_client.get(profile_url), 'Пост в группе'
+        )
 
     def test_user_can_follow(self):
         author = self.user1
@@ -252,6 +271,8 @@ class PaginatorViewsTest(TestCase):
         )
 
     def setUp(self):
+        # bulk_create не поднимает версии областей кеша.
+        cache.clear()
         self.guest_client = Client()
 
     def test_paginator_first_and_second_page(self):
@@ -269,3 +290,446 @@ class PaginatorViewsTest(TestCase):
                 POST = SIZE - QUANTITY_POSTS
                 response = self.guest_client.get(reverse_name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), POST)
+
+    def test_cursor_paginator_walks_all_posts(self):
+        reverse_names = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for reverse_name in reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name + '?cursor=')
+                first_page = response.context['page_obj']
+                self.assertEqual(len(first_page), QUANTITY_POSTS)
+                self.assertFalse(first_page.has_previous())
+                response = self.guest_client.get(
+                    reverse_name + '?cursor=' + first_page.next_cursor
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), SIZE - QUANTITY_POSTS)
+                self.assertFalse(second_page.has_next())
+                seen = {post.pk for post in first_page}
+                seen |= {post.pk for post in second_page}
+                self.assertEqual(seen, set(Post.objects.values_list(
+                    'pk', flat=True
+                )))
+                response = self.guest_client.get(
+                    reverse_name + '?cursor=' + second_page.previous_cursor
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first_page)
+                )
+
+    def test_page_links_to_next_cursor(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=' + str(page_obj.next_cursor)
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), SIZE - QUANTITY_POSTS
+        )
+
+    def test_group_pages_are_stable_while_posting(self):
+        # Одинаковые даты: порядок держится только на id.
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.guest_client.get(
+            url + '?cursor='
+        ).context['page_obj']
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        second_page = self.guest_client.get(
+            url + '?cursor=' + first_page.next_cursor
+        ).context['page_obj']
+        pages = [post.pk for post in first_page]
+        pages += [post.pk for post in second_page]
+        self.assertEqual(pages, list(Post.objects.filter(
+            text='Текст'
+        ).order_by('-pk').values_list('pk', flat=True)))
+        response = self.guest_client.get(url + '?page=2')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            pages[QUANTITY_POSTS - 1:],
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken'
+        )
+        self.assertEqual(len(response.context['page_obj']), QUANTITY_POSTS)
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='writer')
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        ))
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_merged_on_read(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    @override_settings(FEED_FANOUT_LIMIT=0, FEED_MERGE_LIMIT=1)
+    def test_merged_feed_is_limited(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [new_post])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    def test_rebuild_all_matches_incremental_feed(self):
+        other = User.objects.create(username='other')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        Post.objects.create(text='Новый пост', author=self.author)
+        expected = set(FeedItem.objects.values_list(
+            'user', 'post', 'author', 'pub_date'
+        ))
+        feeds.rebuild_all()
+        self.assertEqual(set(FeedItem.objects.values_list(
+            'user', 'post', 'author', 'pub_date'
+        )), expected)
+
+
+class BulkFollowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.authors = [
+            User.objects.create(username=f'writer{n}') for n in range(6)
+        ]
+        for author in cls.authors:
+            Post.objects.create(text='Пост', author=author, group=cls.group)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def post(self, action, **data):
+        return self.authorized_client.post(
+            reverse('posts:follow_bulk'), {'action': action, **data}
+        )
+
+    def test_follow_and_unfollow_many(self):
+        names = ' '.join(author.username for author in self.authors[:3])
+        response = self.post('follow', usernames=f'{names}, reader, nobody')
+        self.assertEqual(
+            response.json(), {'followed': 3, 'missing': ['nobody']}
+        )
+        self.assertEqual(FeedItem.objects.filter(user=self.user).count(), 3)
+        response = self.post('follow', usernames=names)
+        self.assertEqual(response.json()['followed'], 0)
+        response = self.post('unfollow', usernames=names)
+        self.assertEqual(response.json()['unfollowed'], 3)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+
+    def test_follow_group_authors(self):
+        self.post('follow', group=self.group.slug)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user).count(), len(self.authors)
+        )
+
+    def test_queries_do_not_grow_with_authors(self):
+        def queries(action, authors):
+            names = ' '.join(author.username for author in authors)
+            with CaptureQueriesContext(connection) as context:
+                self.post(action, usernames=names)
+            return len(context)
+
+        for action in ('follow', 'unfollow'):
+            with self.subTest(action=action):
+                few = queries(action, self.authors[:2])
+                many = queries(action, self.authors[2:])
+                self.assertEqual(few, many)
+
+    @override_settings(FOLLOW_BULK_LIMIT=2)
+    def test_rejects_too_many_usernames(self):
+        response = self.post('follow', usernames='a b c')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+
+class PostDetailQueriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group
+        )
+
+    def count_detail_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        return len(queries)
+
+    def add_comments(self, count):
+        offset = Comment.objects.count()
+        users = [
+            User.objects.create(username=f'commentator_{offset + i}')
+            for i in range(count)
+        ]
+        for user in users:
+            Comment.objects.create(post=self.post, author=user, text='Текст')
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.add_comments(1)
+        # Первый запрос создаёт недостающие счётчики.
+        self.count_detail_queries()
+        expected = self.count_detail_queries()
+        self.add_comments(10)
+        self.assertEqual(self.count_detail_queries(), expected)
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='auth')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author
+        )
+        for i in range(COMMENTS_PER_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_load_in_chunks(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertContains(response, 'Показать ещё')
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': comments.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertIsNone(rest.next_cursor)
+        self.assertEqual(
+            [comment.pk for comment in list(comments) + list(rest)],
+            list(self.post.comments.values_list('pk', flat=True)),
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='auth')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_page_returns_not_modified_without_queries(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        Comment.objects.create(post=self.post, author=self.author, text='Ок')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_author_and_group_changes_invalidate_post_page(self):
+        group = Group.objects.create(title='Группа', slug='group')
+        self.post.group = group
+        self.post.save()
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+
+        def rename_group():
+            group.title = 'Новая группа'
+            group.save()
+
+        def rename_author():
+            self.author.first_name = 'Анна'
+            self.author.save()
+
+        changes = {
+            'Всего постов автора:  <span >2': lambda: Post.objects.create(
+                text='Ещё пост', author=self.author
+            ),
+            'Новая группа': rename_group,
+            'Анна': rename_author,
+        }
+        for text, change in changes.items():
+            with self.subTest(text=text):
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, text)
+
+    def test_if_modified_since_for_anonymous(self):
+        url = reverse('posts:index')
+        # Секунда последнего изменения уже прошла.
+        with mock.patch(
+            'posts.caching.time.time', return_value=time.time() + 2
+        ):
+            last_modified = self.client.get(url)['Last-Modified']
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+            self.assertEqual(response.status_code, 304)
+            self.client.force_login(self.author)
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_no_last_modified_in_second_of_change(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        # Изменение в ту же секунду, а клиент шлёт только
+        # If-Modified-Since на её начало.
+        since = http_date(time.time() // 1)
+        Post.objects.create(text='Ещё пост', author=self.author)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertContains(response, 'Ещё пост')
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='auth')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_runs_no_queries_until_scope_changes(self):
+        url = reverse('posts:group_list', kwargs={'slug': 'group'})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, 'Тестовый текст')
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.assertContains(self.client.get(url), 'Исправленный текст')
+        Post.objects.create(text='Новый пост', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), 0)
+
+    def test_author_and_group_changes_reach_cached_pages(self):
+        index = reverse('posts:index')
+        group_url = reverse('posts:group_list', kwargs={'slug': 'group'})
+        profile = reverse('posts:profile', kwargs={'username': 'auth'})
+        for url in (index, group_url, profile):
+            self.client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name, author.last_name = 'Анна', 'Русанова'
+        author.save()
+        self.assertContains(self.client.get(index), 'Анна Русанова')
+        self.assertContains(self.client.get(group_url), 'Анна Русанова')
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(self.client.get(group_url).status_code, 404)
+        self.assertContains(
+            self.client.get(profile),
+            reverse('posts:group_list', kwargs={'slug': 'renamed'}),
+        )
+
+    def test_authenticated_requests_served_from_cache(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.client.force_login(self.author)
+        self.client.get(url)
+        for user in (self.author, User.objects.create(username='reader')):
+            with self.subTest(user=user.username):
+                self.client.force_login(user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                # Только сессия и пользователь для шапки.
+                self.assertEqual(len(queries), 2)
+                self.assertContains(response, 'Тестовый текст')
+                self.assertContains(
+                    response, f'Пользователь: {user.username}'
+                )
+                self.assertNotContains(response, '<!--fragment:')
+
+    def test_profile_cached_only_for_anonymous(self):
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        self.client.force_login(self.author)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertGreater(len(queries), 2)
+
+    def test_logged_in_users_share_body_with_own_header(self):
+        url = reverse('posts:index')
+        reader = User.objects.create(username='reader')
+        self.client.force_login(self.author)
+        self.client.get(url)
+        self.client.force_login(reader)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # Только сессия и пользователь для шапки.
+        self.assertEqual(len(queries), 2)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Пользователь: auth')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, '<!--fragment:')
+
+    def test_not_found_page_of_assembled_view_gets_header(self):
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'nope'})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertContains(response, 'Пользователь: auth', status_code=404)
+        self.assertNotContains(response, '<!--fragment:', status_code=404)
@@ -0,0 +1,319 @@
+"""Выгрузка и загрузка контента потоком NDJSON или CSV.
+
+Каждая модель пишется в свой файл каталога: groups, posts, comments,
+follows. Пользователи указываются по username, группы по slug, посты
+сохраняют свои id (как в loaddata), поэтому комментарии ссылаются на
+посты без таблицы соответствия. Объекты читаются и пишутся пачками по
+batch_size, так что память не зависит от объёма данных.
+"""
+import csv
+import json
+import os
+import shutil
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_version
+
+from . import caching, counters, feeds, search
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+FORMATS = ('ndjson', 'csv')
+MEDIA_DIR = 'media'
+
+FIELDS = {
+    'groups': ('slug', 'title', 'description'),
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+# Поля, в которых пустая строка CSV означает None.
+NULLABLE = {'group', 'image'}
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_create_dated(model, objects, field, **kwargs):
+    """bulk_create, сохраняющий явные даты в поле с auto_now_add.
+
+    bulk_create заменяет их текущим временем, поэтому даты проставляются
+    следующим UPDATE. Объектам без id он назначается заранее, иначе их
+    не найти после вставки: после загрузки нужен reset_sequences.
+    """
+    attname = model._meta.get_field(field).attname
+    dates = [getattr(obj, attname) for obj in objects]
+    missing = [obj for obj in objects if obj.pk is None]
+    if missing:
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for pk, obj in enumerate(missing, last + 1):
+            obj.pk = pk
+    model.objects.bulk_create(objects, **kwargs)
+    for obj, date in zip(objects, dates):
+        setattr(obj, attname, date)
+    model.objects.bulk_update(objects, [field])
+
+
+def reset_sequences(*models):
+    """Сдвигает последовательности id за явно заданные id."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def refresh_derived(scopes):
+    """Пересобирает то, что обычно обновляют сигналы: bulk_create их не
+    отправляет. scopes — области кеша, которые затронула загрузка."""
+    counters.reconcile()
+    search.rebuild()
+    feeds.rebuild_all()
+    bump_version(*scopes)
+
+
+def _path(directory, name, format):
+    return os.path.join(directory, f'{name}.{format}')
+
+
+def _write(path, format, fields, rows):
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        if format == 'csv':
+            writer = csv.writer(file)
+            writer.writerow(fields)
+        for row in rows:
+            if format == 'csv':
+                writer.writerow(['' if value is None else value
+                                 for value in row])
+            else:
+                file.write(json.dumps(
+                    dict(zip(fields, row)), ensure_ascii=False
+                ) + '\n')
+            written += 1
+    return written
+
+
+def _read(path, format):
+    if not os.path.exists(path):
+        return
+    with open(path, newline='', encoding='utf-8') as file:
+        if format == 'ndjson':
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        for row in csv.DictReader(file):
+            yield {
+                key: None if key in NULLABLE and value == '' else value
+                for key, value in row.items()
+            }
+
+
+def _exported_rows(name, batch_size):
+    querysets = {
+        'groups': Group.objects.values_list(*FIELDS['groups']),
+        'posts': Post.objects.values_list(
+            'id', 'text', 'pub_date', 'author__username', 'group__slug',
+            'image',
+        ),
+        'comments': Comment.objects.values_list(
+            'post_id', 'author__username', 'text', 'created'
+        ),
+        'follows': Follow.objects.values_list(
+            'user__username', 'author__username'
+        ),
+    }
+    for row in querysets[name].order_by('pk').iterator(batch_size):
+        yield [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ]
+
+
+def export(directory, format='ndjson', media=False, batch_size=BATCH_SIZE,
+           log=print):
+    """Выгружает контент в каталог; возвращает {файл: число записей}.
+
+    С media копирует и картинки постов; отсутствующие в хранилище
+    пропускаются и перечисляются через log.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    for name, fields in FIELDS.items():
+        written[name] = _write(
+            _path(directory, name, format),
+            format,
+            fields,
+            _exported_rows(name, batch_size),
+        )
+    if media:
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        written[MEDIA_DIR] = 0
+        for image in images.iterator(batch_size):
+            try:
+                source = default_storage.open(image)
+            except FileNotFoundError:
+                log(f'Нет файла картинки: {image}')
+                continue
+            target = os.path.join(directory, MEDIA_DIR, image)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with source, open(target, 'wb') as copy:
+                shutil.copyfileobj(source, copy)
+            written[MEDIA_DIR] += 1
+    return written
+
+
+def _users(usernames):
+    """id пользователей по username; недостающие создаются."""
+    usernames = set(usernames)
+    found = dict(User.objects.filter(
+        username__in=usernames
+    ).values_list('username', 'pk'))
+    missing = usernames - found.keys()
+    if missing:
+        User.objects.bulk_create(
+            [User(username=username, password='!') for username in missing],
+            ignore_conflicts=True,
+        )
+        found.update(User.objects.filter(
+            username__in=missing
+        ).values_list('username', 'pk'))
+    return found
+
+
+def _import_groups(rows, scopes):
+    for chunk in rows:
+        Group.objects.bulk_create(
+            [Group(**row) for row in chunk], ignore_conflicts=True
+        )
+        scopes.update(caching.group_scope(row['slug']) for row in chunk)
+        yield len(chunk)
+
+
+def _image_name(image):
+    """Имя картинки из выгрузки: относительный путь внутри MEDIA."""
+    parts = image.replace('\\', '/').split('/')
+    # Пустая первая часть — путь от корня.
+    if image and (parts[0] == '' or '..' in parts):
+        raise ValueError(f'Недопустимое имя картинки: {image!r}')
+    return image
+
+
+def _import_posts(rows, directory, media, scopes):
+    image_field = Post._meta.get_field('image')
+    for chunk in rows:
+        # Существующие посты пропускаются: их дату не трогаем.
+        existing = set(Post.objects.filter(
+            pk__in={int(row['id']) for row in chunk}
+        ).values_list('pk', flat=True))
+        new = [row for row in chunk if int(row['id']) not in existing]
+        users = _users(row['author'] for row in new)
+        groups = dict(Group.objects.filter(
+            slug__in={row['group'] for row in new if row['group']}
+        ).values_list('slug', 'pk'))
+        posts = []
+        for row in new:
+            image = _image_name(row['image'] or '')
+            source = os.path.join(directory, MEDIA_DIR, image)
+            if image and media and os.path.exists(source):
+                name = image_field.generate_filename(
+                    None, os.path.basename(image)
+                )
+                with open(source, 'rb') as file:
+                    image = default_storage.save(name, File(file))
+            posts.append(Post(
+                id=int(row['id']),
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                author_id=users[row['author']],
+                group_id=groups.get(row['group']),
+                image=image,
+            ))
+        bulk_create_dated(Post, posts, 'pub_date', ignore_conflicts=True)
+        for row in new:
+            scopes.add(caching.author_scope(row['author']))
+            if row['group']:
+                scopes.add(caching.group_scope(row['group']))
+        scopes.update(caching.author_id_scope(pk) for pk in users.values())
+        scopes.update(caching.group_id_scope(pk) for pk in groups.values())
+        yield len(chunk)
+
+
+def _import_comments(rows, scopes):
+    for chunk in rows:
+        users = _users(row['author'] for row in chunk)
+        posts = set(Post.objects.filter(
+            pk__in={int(row['post']) for row in chunk}
+        ).values_list('pk', flat=True))
+        bulk_create_dated(Comment, [
+            Comment(
+                post_id=int(row['post']),
+                author_id=users[row['author']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            )
+            for row in chunk if int(row['post']) in posts
+        ], 'created')
+        scopes.update(caching.post_scope(pk) for pk in posts)
+        yield len(chunk)
+
+
+def _import_follows(rows, scopes):
+    for chunk in rows:
+        users = _users(
+            username for row in chunk for username in row.values()
+        )
+        Follow.objects.bulk_create([
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in chunk if row['user'] != row['author']
+        ], ignore_conflicts=True)
+        scopes.update(
+            caching.follow_scope(users[row['user']]) for row in chunk
+        )
+        yield len(chunk)
+
+
+def load(directory, format='ndjson', media=False, batch_size=BATCH_SIZE):
+    """Загружает выгрузку из каталога; возвращает {файл: число записей}.
+
+    Уже существующие группы (по slug), посты (по id) и подписки
+    пропускаются; комментарии привязываются к постам по id, поэтому
+    выгрузку стоит загружать в базу, где таких id ещё нет.
+    """
+    def rows(name):
+        return _chunks(
+            _read(_path(directory, name, format), format), batch_size
+        )
+
+    scopes = {caching.INDEX}
+    steps = {
+        'groups': _import_groups(rows('groups'), scopes),
+        'posts': _import_posts(rows('posts'), directory, media, scopes),
+        'comments': _import_comments(rows('comments'), scopes),
+        'follows': _import_follows(rows('follows'), scopes),
+    }
+    loaded = {}
+    with transaction.atomic():
+        for name, step in steps.items():
+            loaded[name] = sum(step)
+        reset_sequences(Group, Post, Comment, Follow)
+    refresh_derived(scopes)
+    return loaded
@@ -0,0 +1,80 @@
+"""Приём картинок постов с ограниченным расходом памяти.
+
+Загрузка пишется на диск (FILE_UPLOAD_MAX_MEMORY_SIZE), а байты сверх
+IMAGE_UPLOAD_MAX_SIZE не сохраняются вовсе. Размеры картинки проверяются
+по заголовку до декодирования, а оригинал перекодируется без метаданных
+и уменьшается до IMAGE_MAX_SIDE; JPEG при этом декодируется сразу в
+уменьшенном масштабе (draft).
+"""
+import os
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+# Форматы, в которых оригинал остаётся; остальные сохраняются в PNG.
+KEEP_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+JPEG_QUALITY = 90
+
+
+class OversizedUpload(UploadedFile):
+    """Заглушка вместо файла, превысившего IMAGE_UPLOAD_MAX_SIZE."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Отбрасывает всё, что приходит сверх IMAGE_UPLOAD_MAX_SIZE.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS: пока лимит не превышен, данные
+    проходят к следующим обработчикам, после — не доходят ни до памяти,
+    ни до диска, а форма получает OversizedUpload с настоящим размером.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received <= settings.IMAGE_UPLOAD_MAX_SIZE:
+            return None
+        return OversizedUpload(
+            self.file_name, self.content_type, self.received
+        )
+
+
+def normalize(file):
+    """Перекодирует картинку без метаданных, не больше IMAGE_MAX_SIDE.
+
+    Анимированные картинки возвращаются как есть.
+    """
+    max_side = settings.IMAGE_MAX_SIDE
+    image = Image.open(file)
+    if getattr(image, 'is_animated', False):
+        file.seek(0)
+        return file
+    format = image.format if image.format in KEEP_FORMATS else 'PNG'
+    image.draft(None, (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side))
+    if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    options = {'quality': JPEG_QUALITY} if format == 'JPEG' else {}
+    image.save(output, format, optimize=True, **options)
+    size = output.tell()
+    output.seek(0)
+    name = f'{os.path.splitext(file.name)[0]}.{KEEP_FORMATS[format]}'
+    return UploadedFile(output, name, Image.MIME[format], size)
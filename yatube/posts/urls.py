@@ -13,7 +13,14 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<post_id>/comment/', views.add_comment, name='add_comment'),
+    path(
+        'posts/<post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
+    path('search/', views.post_search, name='search'),
     path(
         'profile/<username>/follow/',
         views.profile_follow,
@@ -1,41 +1,75 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+
 from django.core.paginator import Paginator
 
+from django.db import transaction
+
 from django.contrib.auth.decorators import login_required
 
+from django.http import JsonResponse
+
 from django.shortcuts import get_object_or_404, render, redirect
 
-from .forms import PostForm, CommentForm
+from django.utils.functional import lazy
+
+from django.views.decorators.http import require_POST
+
+from core.cache import get_version
+
+from core.replicas import read_from_replica
+
+from . import caching, counters, feeds, follows, search
 
-from .models import Follow, Post, Group, User
+from .forms import BulkFollowForm, PostForm, CommentForm
+
+from .models import Counter, Follow, Post, Group, User
+
+from .paginators import CursorPaginator, KeysetChunk, encode_cursor
 
 
 QUANTITY_POSTS = 10
+COMMENTS_PER_PAGE = 20
 
 
+@read_from_replica
+@caching.conditional(caching.index_scopes)
+@caching.assembled_page(caching.index_scopes)
 def index(request):
     posts = Post.objects.select_related('group', 'author')
     title = 'Последние обновления на сайте'
-    page_obj = paginator(request, posts)
+    page_obj = paginator(request, posts, counters.get(Counter.POSTS))
     context = {
         'page_obj': page_obj,
         'title': title,
+        'cache_version': get_version(caching.INDEX),
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@caching.conditional(caching.group_scopes)
+@caching.assembled_page(caching.group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.order_by()
+    posts = group.posts.all()
     title = 'Записи сообщества ' + group.title
-    page_obj = paginator(request, posts)
+    page_obj = paginator(
+        request, posts, counters.get(Counter.GROUP_POSTS, group.pk)
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
         'title': title,
+        'cache_version': get_version(caching.group_scope(slug)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@caching.conditional(caching.profile_scopes)
+@caching.anonymous_page(caching.profile_scopes)
 def profile(request, username):
     title = 'Профайл пользователя ' + username
     author = get_object_or_404(User, username=username)
@@ -43,30 +77,78 @@ def profile(request, username):
         author != request.user.is_authenticated and author.following.exists
     )
     posts = author.posts.all()
-    page_obj = paginator(request, posts)
+    posts_count = counters.get(Counter.AUTHOR_POSTS, author.pk)
+    page_obj = paginator(request, posts, posts_count)
     context = {
         'title': title,
         'page_obj': page_obj,
         'author': author,
         'following': following,
+        'posts_count': posts_count,
+        'cache_version': get_version(caching.author_scope(username)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+@caching.conditional(caching.post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     comment_form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = KeysetChunk(
+        post.comments.select_related('author'),
+        'created',
+        None,
+        COMMENTS_PER_PAGE,
+    )
     title = 'Пост ' + post.text[0:30] + '...'
     context = {
         'post': post,
         'title': title,
         'comments': comments,
+        'comments_count': counters.get(Counter.POST_COMMENTS, post.pk),
+        'author_posts_count': counters.get(
+            Counter.AUTHOR_POSTS, post.author_id
+        ),
         'form': comment_form,
+        'cache_version': get_version(caching.post_scope(post.pk)),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_from_replica
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста в виде HTML-фрагмента."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = KeysetChunk(
+        post.comments.select_related('author'),
+        'created',
+        request.GET.get('after'),
+        COMMENTS_PER_PAGE,
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@read_from_replica
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search.SearchResults(query), QUANTITY_POSTS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'title': 'Поиск: ' + query,
+        'page_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -76,9 +158,11 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        # Вместе с постом сигналы ставят фоновые задачи (core.jobs):
+        # сохраняются одной транзакцией или не сохраняются вовсе.
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', username=post.author)
-    form = PostForm()
     context = {
         'form': form,
         'is_edit': False,
@@ -97,7 +181,8 @@ def post_edit(request, post_id):
     if form.is_valid():
         post.author = request.user
         post = form.save(commit=False)
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, 'posts/create_post.html',
                   {'form': form, 'is_edit': True})
@@ -111,20 +196,35 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
+    # Версия — до запросов: после свежего изменения они идут в основную
+    # базу (core.cache.get_version).
+    cache_version = get_version(
+        caching.follow_scope(request.user.pk), caching.INDEX
     )
-    page_obj = paginator(request, posts)
+    celebrities = feeds.followed_celebrities(request.user)
+    posts = feeds.feed_posts(request.user, celebrities).select_related(
+        'group', 'author'
+    )
+    authors = Follow.objects.filter(
+        user=request.user
+    ).values_list('author_id', flat=True)
+    count = counters.total(Counter.AUTHOR_POSTS, authors)
+    if celebrities:
+        count = min(count, settings.FEED_MERGE_LIMIT)
+    page_obj = paginator(request, posts, count)
     title = 'Подписки пользователя '
     context = {
         'page_obj': page_obj,
         'title': title,
+        'cache_version': cache_version,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -152,7 +252,48 @@ def profile_unfollow(request, username):
     return redirect('posts:profile', username=username)
 
 
-def paginator(request, posts):
+@login_required
+@require_POST
+def follow_bulk(request):
+    """Подписаться на многих авторов или отписаться от них сразу"""
+    form = BulkFollowForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    usernames = form.cleaned_data['usernames']
+    group = form.cleaned_data['group']
+    missing = set()
+    if group is not None:
+        authors = User.objects.filter(posts__group=group).distinct()
+    else:
+        authors = follows.authors(usernames)
+        missing = usernames - set(
+            authors.values_list('username', flat=True)
+        )
+    if form.cleaned_data['action'] == BulkFollowForm.FOLLOW:
+        result = {'followed': follows.follow_many(request.user, authors)}
+    else:
+        result = {'unfollowed': follows.unfollow_many(request.user, authors)}
+    result['missing'] = sorted(missing)
+    return JsonResponse(result)
+
+
+def paginator(request, posts, count=None):
+    """Страница ленты: по номеру или, если передан cursor, по курсору.
+
+    count — заранее известное число постов, чтобы не делать COUNT(*).
+    """
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        return CursorPaginator(posts, QUANTITY_POSTS).get_page(cursor)
     paginator = Paginator(posts, QUANTITY_POSTS)
+    if count is not None:
+        paginator.count = count
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    page_obj = paginator.get_page(page_number)
+    if posts.ordered and page_obj.has_next():
+        # Курсор считается лениво: закешированный фрагмент ленты
+        # не должен вызывать запрос страницы.
+        page_obj.next_cursor = lazy(
+            lambda: encode_cursor(page_obj[-1]), str
+        )()
+    return page_obj
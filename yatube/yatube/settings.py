@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.FragmentMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -65,7 +68,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,9 +93,42 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Сколько секунд ждать чужую запись вместо database is locked.
+        'OPTIONS': {'timeout': 20},
+        # Соединение живёт между запросами вместо открытия на каждый.
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
     }
 }
 
+# PRAGMA для каждого нового соединения SQLite (core.sqlite). Эффект на
+# конкурентной нагрузке показывает manage.py benchmark_sqlite;
+# SQLITE_PROFILE=default оставляет настройки SQLite по умолчанию.
+SQLITE_PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 2 ** 20,
+        # Отрицательное значение — в КиБ: 64 МБ.
+        'cache_size': -64 * 2 ** 10,
+    },
+    'default': {},
+}
+SQLITE_PRAGMAS = SQLITE_PROFILES[os.getenv('SQLITE_PROFILE', 'production')]
+
+# Реплики только для чтения (core.replicas). Локально реплика — второй
+# файл SQLite, который копирует основную базу команда sync_replicas:
+#     DATABASES['replica'] = {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+#         'TEST': {'MIRROR': 'default'},
+#     }
+#     DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы:
+# должно перекрывать отставание реплик.
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -147,11 +183,120 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Одинаковые загрузки хранятся одним файлом с именем по содержимому.
+# Миниатюры sorl-thumbnail уже названы по хешу и лежат в обычном хранилище.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Загрузки больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся во временный файл,
+# байты сверх IMAGE_UPLOAD_MAX_SIZE отбрасываются (posts.uploads).
+# Оригиналы картинок уменьшаются до IMAGE_MAX_SIDE пикселей по большей
+# стороне, картинки больше IMAGE_UPLOAD_MAX_PIXELS не принимаются.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.SizeLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2 ** 19
+IMAGE_UPLOAD_MAX_SIZE = 10 * 2 ** 20
+IMAGE_UPLOAD_MAX_PIXELS = 25 * 10 ** 6
+IMAGE_MAX_SIDE = 2560
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-CACHES = {
-    'default': {
+# Кеш общий для всех воркеров: файл SQLite на локальном диске.
+# CACHE_BACKEND=locmem возвращает кеш в память процесса (так работают
+# тесты, см. yatube.test_settings).
+CACHE_BACKENDS = {
+    'sqlite': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+            'MAX_SIZE': int(os.getenv('CACHE_MAX_SIZE', 256 * 2 ** 20)),
+        },
+    },
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[
+        os.getenv('CACHE_BACKEND', 'sqlite')
+    ],
+}
+
+# Ответы страниц лент целиком (posts.caching.anonymous_page и
+# assembled_page). Ключ содержит версию области, поэтому срок жизни
+# ограничивает только объём.
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Лента подписок: посты авторов, у которых подписчиков больше
+# FEED_FANOUT_LIMIT, не раскладываются по лентам, а читаются напрямую.
+FEED_FANOUT_LIMIT = 1000
+FEED_BATCH_SIZE = 500
+FEED_CELEBRITIES_TIMEOUT = 60 * 5
+# Сколько новых постов ленты и каждой знаменитости сливается при чтении
+# (posts.feeds.merged_posts): дальше лента со знаменитостями не листается.
+FEED_MERGE_LIMIT = 1000
+
+# Сколько имён принимает массовая подписка (posts.views.follow_bulk) за
+# один запрос: все они уходят в один IN (...).
+FOLLOW_BULK_LIMIT = 500
+
+# Защита от одновременного пересчёта кеша (core.cache.get_or_compute):
+# сколько секунд отдавать устаревшее значение, пока оно пересчитывается,
+# сколько держится блокировка и сколько ждать чужого пересчёта.
+CACHE_GRACE_PERIOD = 60
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2
+
+# Варианты миниатюр для srcset ({% responsive_image %}): каждая ширина в
+# каждом формате, который поддерживают Pillow и sorl-thumbnail. Форматы
+# перечислены от предпочтительного; последний отдаётся в <img> как запасной.
+# Все варианты готовятся в фоне сразу после загрузки картинки.
+THUMBNAIL_ASPECT = (960, 339)
+THUMBNAIL_WIDTHS = [320, 640, 960]
+THUMBNAIL_FORMATS = ['AVIF', 'WEBP', 'JPEG']
+THUMBNAIL_SIZES = '(min-width: 992px) 960px, 100vw'
+
+# Фоновые задачи (core.jobs): раскладка лент, поиск, миниатюры. Их
+# выполняет manage.py run_jobs; с JOBS_EAGER=1 задачи выполняются сразу
+# при постановке. По умолчанию так и есть при DEBUG: без воркера ленты,
+# поиск и миниатюры иначе не обновлялись бы. В бою — JOBS_EAGER=0 и
+# запущенный run_jobs.
+JOBS_EAGER = os.getenv('JOBS_EAGER', '1' if DEBUG else '0') == '1'
+JOBS_MAX_ATTEMPTS = 5
+# Задержка перед повтором удваивается с каждой попыткой, с.
+JOBS_RETRY_DELAY = 10
+# Сколько секунд задача принадлежит воркеру; потом её заберёт другой.
+JOBS_LEASE = 5 * 60
+
+# Метрики запросов (core.middleware.MetricsMiddleware): заголовок
+# Server-Timing и бюджеты, при превышении которых запрос пишется в лог
+# core.metrics с уровнем WARNING.
+METRICS_SERVER_TIMING = True
+REQUEST_BUDGETS = {
+    'queries': 30,
+    'db_ms': 100,
+    'template_ms': 100,
+    'total_ms': 300,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('METRICS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }
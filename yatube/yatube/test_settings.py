@@ -0,0 +1,17 @@
+"""Настройки для тестов: manage.py test и pytest выбирают их сами.
+
+Кеш в памяти процесса, чтобы не видеть данные прошлых запусков, задачи
+core.jobs выполняются сразу при постановке, а лог метрик не засоряет
+вывод тестов.
+"""
+from copy import deepcopy
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHE_BACKENDS, LOGGING
+
+CACHES = {'default': CACHE_BACKENDS['locmem']}
+
+JOBS_EAGER = True
+
+LOGGING = deepcopy(LOGGING)
+LOGGING['loggers']['core.metrics']['level'] = 'ERROR'